@@ -10,9 +10,12 @@ Usage:
 from __future__ import annotations
 
 import contextlib
+import itertools
 import json
+import os
 import pathlib
-import random
+import re
+import threading
 import time
 from typing import Any
 
@@ -22,20 +25,46 @@ from mysql.connector import pooling  # type: ignore
 from config import Config, Production
 
 
+# A complete snapshot answers cache misses for this long (a few missed 30s refreshes).
+CACHE_FULL_TTL_SECS = 120
+# Cached stock is trusted for this long before a scan re-reads the row; other terminals sell too.
+STOCK_TTL_SECS = 60
+
+
 class DatabaseError(Exception):
     """Raised when a DB operation fails."""
 
 
 class ProductModel:
+    # Process-wide sale id sequence seeded from the clock in microseconds: strictly
+    # increasing, larger than the old millisecond ids, and still below 2**53.
+    _id_counter = itertools.count(time.time_ns() // 1000)
+    # The installed driver cannot change at runtime, so its version is checked once.
+    _driver_validated: bool = False
+
     def __init__(self, config: type[Config] = Production) -> None:
         self.config = config
         self._pool: pooling.MySQLConnectionPool | None = None
         self._staff_pool: pooling.MySQLConnectionPool | None = None
+        # Pools may be first used from the GUI thread and a background cache refresh at once.
+        self._pool_lock = threading.Lock()
+        self._ro_conn = None
+        # Cleared if the server reports no FULLTEXT index on products.name.
+        self._fulltext_ok = True
         self.cache_path = pathlib.Path(__file__).parent / "products_cache.json"
+        # In-memory copy of the cache files, invalidated when their mtimes change.
+        self._cache_mem: list[dict[str, Any]] | None = None
+        self._cache_index: dict[str, dict[str, Any]] = {}
+        self._cache_stamp: tuple[float, float] | None = None
+        self._cache_full_ts: float | None = None
+        self._search_keys: list[tuple[str, dict[str, Any]]] | None = None
 
     def _validate_mysql_connector(self) -> None:
+        if ProductModel._driver_validated:
+            return
         version = getattr(mysql.connector, "__version__", "")
         if not version:
+            ProductModel._driver_validated = True
             return
         try:
             major = int(version.split(".")[0])
@@ -46,6 +75,7 @@ class ProductModel:
                 f"MySQL driver {version} is unsupported. "
                 "Uninstall 'mysql-connector' and install 'mysql-connector-python>=8.0'."
             )
+        ProductModel._driver_validated = True
 
     def _get_ssl_ca(self) -> str | None:
         if not self.config.SSL:
@@ -54,139 +84,306 @@ class ProductModel:
         return str(ca_path.resolve())
 
     def _pool_connect(self):
-        if self._pool is None:
-            self._validate_mysql_connector()
-            ssl_ca = self._get_ssl_ca()
-            pool_kwargs = {
-                "pool_name": "pos_pool",
-                "pool_size": 4,
-                "host": self.config.HOST_DB,
-                "user": self.config.USER_DB,
-                "password": self.config.PASS_DB,
-                "database": getattr(self.config, "DB_NAME", "mgdb"),
-                "port": int(self.config.PORT or 3306),
-                "charset": "utf8mb4",
-                "collation": "utf8mb4_unicode_ci",
-                "autocommit": True,
-            }
-            if ssl_ca:
-                pool_kwargs["ssl_ca"] = ssl_ca
-            try:
-                self._pool = pooling.MySQLConnectionPool(**pool_kwargs)
-            except AttributeError as exc:
-                if "wrap_socket" in str(exc):
-                    raise DatabaseError(
-                        "MySQL SSL support failed. Install 'mysql-connector-python>=8.0' "
-                        "or use a Python build with SSL support."
-                    ) from exc
-                raise DatabaseError(str(exc)) from exc
-            except mysql.connector.Error as exc:  # type: ignore
-                raise DatabaseError(str(exc)) from exc
+        with self._pool_lock:
+            if self._pool is None:
+                self._validate_mysql_connector()
+                ssl_ca = self._get_ssl_ca()
+                pool_kwargs = {
+                    "pool_name": "pos_pool",
+                    "pool_size": 4,
+                    "host": self.config.HOST_DB,
+                    "user": self.config.USER_DB,
+                    "password": self.config.PASS_DB,
+                    "database": getattr(self.config, "DB_NAME", "mgdb"),
+                    "port": int(self.config.PORT or 3306),
+                    "charset": "utf8mb4",
+                    "collation": "utf8mb4_unicode_ci",
+                    "autocommit": True,
+                    # Decode rows in the C extension when the wheel ships it.
+                    "use_pure": not getattr(mysql.connector, "HAVE_CEXT", False),
+                }
+                if ssl_ca:
+                    pool_kwargs["ssl_ca"] = ssl_ca
+                try:
+                    self._pool = pooling.MySQLConnectionPool(**pool_kwargs)
+                except AttributeError as exc:
+                    if "wrap_socket" in str(exc):
+                        raise DatabaseError(
+                            "MySQL SSL support failed. Install 'mysql-connector-python>=8.0' "
+                            "or use a Python build with SSL support."
+                        ) from exc
+                    raise DatabaseError(str(exc)) from exc
+                except mysql.connector.Error as exc:  # type: ignore
+                    raise DatabaseError(str(exc)) from exc
         try:
             return self._pool.get_connection()
         except mysql.connector.Error as exc:  # type: ignore
             raise DatabaseError(str(exc)) from exc
 
     def _staff_pool_connect(self):
-        if self._staff_pool is None:
-            self._validate_mysql_connector()
-            ssl_ca = self._get_ssl_ca()
-            pool_kwargs = {
-                "pool_name": "staff_pool",
-                "pool_size": 3,
-                "host": self.config.HOST_DB,
-                "user": self.config.USER_DB,
-                "password": self.config.PASS_DB,
-                "database": getattr(self.config, "STAFF_DB_NAME", "erfandb"),
-                "port": int(self.config.PORT or 3306),
-                "charset": "utf8mb4",
-                "collation": "utf8mb4_unicode_ci",
-                "autocommit": True,
-            }
-            if ssl_ca:
-                pool_kwargs["ssl_ca"] = ssl_ca
-            try:
-                self._staff_pool = pooling.MySQLConnectionPool(**pool_kwargs)
-            except AttributeError as exc:
-                if "wrap_socket" in str(exc):
-                    raise DatabaseError(
-                        "MySQL SSL support failed. Install 'mysql-connector-python>=8.0' "
-                        "or use a Python build with SSL support."
-                    ) from exc
-                raise DatabaseError(str(exc)) from exc
-            except mysql.connector.Error as exc:  # type: ignore
-                raise DatabaseError(str(exc)) from exc
+        with self._pool_lock:
+            if self._staff_pool is None:
+                self._validate_mysql_connector()
+                ssl_ca = self._get_ssl_ca()
+                pool_kwargs = {
+                    "pool_name": "staff_pool",
+                    "pool_size": 3,
+                    "host": self.config.HOST_DB,
+                    "user": self.config.USER_DB,
+                    "password": self.config.PASS_DB,
+                    "database": getattr(self.config, "STAFF_DB_NAME", "erfandb"),
+                    "port": int(self.config.PORT or 3306),
+                    "charset": "utf8mb4",
+                    "collation": "utf8mb4_unicode_ci",
+                    "autocommit": True,
+                    # Decode rows in the C extension when the wheel ships it.
+                    "use_pure": not getattr(mysql.connector, "HAVE_CEXT", False),
+                }
+                if ssl_ca:
+                    pool_kwargs["ssl_ca"] = ssl_ca
+                try:
+                    self._staff_pool = pooling.MySQLConnectionPool(**pool_kwargs)
+                except AttributeError as exc:
+                    if "wrap_socket" in str(exc):
+                        raise DatabaseError(
+                            "MySQL SSL support failed. Install 'mysql-connector-python>=8.0' "
+                            "or use a Python build with SSL support."
+                        ) from exc
+                    raise DatabaseError(str(exc)) from exc
+                except mysql.connector.Error as exc:  # type: ignore
+                    raise DatabaseError(str(exc)) from exc
         try:
             return self._staff_pool.get_connection()
         except mysql.connector.Error as exc:  # type: ignore
             raise DatabaseError(str(exc)) from exc
 
+    def _ro_connect(self):
+        self._validate_mysql_connector()
+        ssl_ca = self._get_ssl_ca()
+        conn_kwargs = {
+            "host": self.config.HOST_DB,
+            "user": self.config.USER_DB,
+            "password": self.config.PASS_DB,
+            "database": getattr(self.config, "DB_NAME", "mgdb"),
+            "port": int(self.config.PORT or 3306),
+            "charset": "utf8mb4",
+            "collation": "utf8mb4_unicode_ci",
+            "autocommit": True,
+            "use_pure": not getattr(mysql.connector, "HAVE_CEXT", False),
+        }
+        if ssl_ca:
+            conn_kwargs["ssl_ca"] = ssl_ca
+        try:
+            return mysql.connector.connect(**conn_kwargs)
+        except AttributeError as exc:
+            if "wrap_socket" in str(exc):
+                raise DatabaseError(
+                    "MySQL SSL support failed. Install 'mysql-connector-python>=8.0' "
+                    "or use a Python build with SSL support."
+                ) from exc
+            raise DatabaseError(str(exc)) from exc
+        except mysql.connector.Error as exc:  # type: ignore
+            raise DatabaseError(str(exc)) from exc
+
     @contextlib.contextmanager
-    def _cursor(self):
+    def _ro_checkout(self):
+        """
+        Long-lived autocommit connection for GUI-thread product reads. Skips the pool,
+        whose checkout pings the server before handing out a connection.
+        """
+        if self._ro_conn is None:
+            self._ro_conn = self._ro_connect()
+        yield self._ro_conn
+
+    def _ro_read(self, fetch, *args):
+        """Run `fetch(self._ro_checkout, *args)`, reconnecting once if the connection dropped."""
+        try:
+            return fetch(self._ro_checkout, *args)
+        except mysql.connector.Error:  # type: ignore
+            # A lost connection does not always surface as InterfaceError/OperationalError
+            # (e.g. 2006 "gone away" or 4031 idle disconnect map to DatabaseError), so drop
+            # the cached connection on any error and retry once on a fresh one.
+            self._close_ro_conn()
+        try:
+            return fetch(self._ro_checkout, *args)
+        except mysql.connector.Error as exc:  # type: ignore
+            self._close_ro_conn()
+            raise DatabaseError(str(exc)) from exc
+
+    def _close_ro_conn(self) -> None:
+        conn, self._ro_conn = self._ro_conn, None
+        if conn is not None:
+            with contextlib.suppress(Exception):
+                conn.close()
+
+    @contextlib.contextmanager
+    def _checkout(self):
         conn = self._pool_connect()
-        cur = conn.cursor(dictionary=True)
         try:
-            yield cur
+            yield conn
         finally:
-            cur.close()
             conn.close()
 
     @contextlib.contextmanager
-    def _staff_cursor(self):
+    def _staff_checkout(self):
         conn = self._staff_pool_connect()
-        cur = conn.cursor(dictionary=True)
         try:
-            yield cur
+            yield conn
         finally:
-            cur.close()
             conn.close()
 
+    @contextlib.contextmanager
+    def _cursor(self, buffered: bool = False):
+        with self._checkout() as conn:
+            cur = conn.cursor(dictionary=True, buffered=buffered)
+            try:
+                yield cur
+            finally:
+                cur.close()
+
+    @contextlib.contextmanager
+    def _staff_cursor(self, buffered: bool = False):
+        with self._staff_checkout() as conn:
+            cur = conn.cursor(dictionary=True, buffered=buffered)
+            try:
+                yield cur
+            finally:
+                cur.close()
+
+    def _fetch_one(self, checkout, sql: str, params: tuple) -> dict[str, Any] | None:
+        with checkout() as conn:
+            cur = conn.cursor(dictionary=True, buffered=True)
+            try:
+                cur.execute(sql, params)
+                return cur.fetchone()
+            finally:
+                cur.close()
+
+    def _fetch_all(self, checkout, sql: str, params: tuple) -> list[dict[str, Any]]:
+        with checkout() as conn:
+            cur = conn.cursor(dictionary=True, buffered=True)
+            try:
+                cur.execute(sql, params)
+                return cur.fetchall() or []
+            finally:
+                cur.close()
+
+    @contextlib.contextmanager
+    def _tx_cursor(self, checkout, dictionary: bool = False):
+        """
+        Yield a cursor inside an explicit transaction on a connection from `checkout`.
+        Commits on success, rolls back on error, then restores autocommit.
+        """
+        with checkout() as conn:
+            # Pooled connections forward attribute reads but not writes, so autocommit
+            # has to be switched on the wrapped connection itself.
+            raw = getattr(conn, "_cnx", None) or conn
+            raw.autocommit = False
+            cur = conn.cursor(dictionary=dictionary)
+            try:
+                yield cur
+                conn.commit()
+            except mysql.connector.Error as exc:  # type: ignore
+                conn.rollback()
+                raise DatabaseError(str(exc)) from exc
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                cur.close()
+                with contextlib.suppress(mysql.connector.Error):  # type: ignore
+                    raw.autocommit = True
+
     def fetch_product_by_barcode(self, barcode: str) -> dict[str, Any] | None:
-        """Return one product by barcode (cache first, then DB)."""
+        """
+        Return one product by barcode (cache first, then DB).
+        Entries older than STOCK_TTL_SECS are re-read so stock reflects other terminals' sales.
+        DB reads select only the columns the sale screen uses; relies on an index on barcode.
+        """
         cached = self._find_in_cache_by_barcode(barcode)
         if cached:
-            return cached
+            if time.time() - float(cached.get("_fetched_ts") or 0) < STOCK_TTL_SECS:
+                return cached
+        elif self._cache_is_authoritative():
+            # The snapshot holds every product, so a miss is a bad scan; skip the DB.
+            return None
 
         sql = """
-            SELECT id, sku, name, stock, category, cost_price, sell_price,
-                   description, barcode, gst, gst_rate, status, deduct_unit
+            SELECT id, sku, name, stock, sell_price, barcode, gst, gst_rate, deduct_unit
             FROM products
             WHERE barcode = %s
             LIMIT 1
         """
-        with self._cursor() as cur:
-            cur.execute(sql, (barcode,))
-            row = cur.fetchone()
+        try:
+            row = self._ro_read(self._fetch_one, sql, (barcode,))
+        except DatabaseError:
+            if cached:
+                # Stale stock beats blocking the sale while the DB is unreachable.
+                return cached
+            raise
         product = self._normalize_product(row) if row else None
         if product:
+            if cached:
+                # Keep columns the narrow select skips (cost_price, description, ...).
+                product = {**cached, **product}
             self._merge_into_cache([product])
         return product
 
     def search_products(self, query: str, limit: int = 10) -> list[dict[str, Any]]:
         """
-        Search products by name or barcode (substring).
-        Cache first for speed; fallback to DB if nothing found.
+        Search products by name or barcode.
+        Cache first for speed; fallback to DB if nothing found. All-digit queries are treated
+        as barcode prefixes (index range scan); others go through FULLTEXT on name.
         """
         query = query.strip()
         cached_results = self.search_cache(query, limit=limit)
         if cached_results:
             return cached_results
+        if len(query) < 2:
+            return []
+
+        if query.isdigit():
+            sql = """
+                SELECT id, sku, name, stock, category, sell_price, barcode, deduct_unit
+                FROM products
+                WHERE barcode LIKE %s
+                ORDER BY barcode ASC
+                LIMIT %s
+            """
+            rows = self._ro_read(self._fetch_all, sql, (f"{query}%", limit))
+        else:
+            rows = self._search_products_by_name(query, limit)
+        products = [self._normalize_product(row) for row in rows]
+        if products:
+            self._merge_into_cache(products)
+        return products
+
+    def _search_products_by_name(self, query: str, limit: int) -> list[dict[str, Any]]:
+        # Every word must match as a prefix; stripping punctuation keeps boolean operators out.
+        terms = " ".join(f"+{word}*" for word in re.findall(r"\w+", query))
+        if terms and self._fulltext_ok:
+            sql = """
+                SELECT id, sku, name, stock, category, sell_price, barcode, deduct_unit
+                FROM products
+                WHERE MATCH(name) AGAINST(%s IN BOOLEAN MODE)
+                ORDER BY name ASC
+                LIMIT %s
+            """
+            try:
+                return self._ro_read(self._fetch_all, sql, (terms, limit))
+            except DatabaseError as exc:
+                if "FULLTEXT" not in str(exc):
+                    raise
+                self._fulltext_ok = False
 
-        like = f"%{query}%"
         sql = """
             SELECT id, sku, name, stock, category, sell_price, barcode, deduct_unit
             FROM products
-            WHERE name LIKE %s OR barcode LIKE %s
+            WHERE name LIKE %s
             ORDER BY name ASC
             LIMIT %s
         """
-        with self._cursor() as cur:
-            cur.execute(sql, (like, like, limit))
-            rows = cur.fetchall() or []
-        products = [self._normalize_product(row) for row in rows]
-        if products:
-            self._merge_into_cache(products)
-        return products
+        return self._ro_read(self._fetch_all, sql, (f"%{query}%", limit))
 
     # --- Cache helpers -------------------------------------------------------
     def prime_cache(self, force_refresh: bool = False) -> list[dict[str, Any]]:
@@ -197,7 +394,7 @@ class ProductModel:
         if self.cache_path.exists() and not force_refresh:
             return self.load_cache()
         products = self.fetch_all_products()
-        self.save_cache(products)
+        self.save_cache(products, full=True)
         return products
 
     def fetch_all_products(self) -> list[dict[str, Any]]:
@@ -206,57 +403,218 @@ class ProductModel:
                    description, barcode, gst, gst_rate, status, deduct_unit
             FROM products
         """
-        with self._cursor() as cur:
+        # Buffered: the driver pulls the whole result set off the socket in one pass.
+        with self._cursor(buffered=True) as cur:
             cur.execute(sql)
             rows = cur.fetchall() or []
         return [self._normalize_product(row) for row in rows]
 
+    @property
+    def cache_log_path(self) -> pathlib.Path:
+        """Append-only JSONL of products merged since the last full snapshot was written."""
+        return self.cache_path.with_suffix(".log.jsonl")
+
+    @property
+    def cache_meta_path(self) -> pathlib.Path:
+        """Marks the snapshot as the complete product list, with the time it was fetched."""
+        return self.cache_path.with_suffix(".meta.json")
+
+    def _stat_cache_files(self) -> tuple[float, float] | None:
+        """(snapshot mtime, log mtime) or None when there is no snapshot."""
+        try:
+            snapshot_mtime = self.cache_path.stat().st_mtime
+        except OSError:
+            return None
+        try:
+            log_mtime = self.cache_log_path.stat().st_mtime
+        except OSError:
+            log_mtime = 0.0
+        return snapshot_mtime, log_mtime
+
     def load_cache(self) -> list[dict[str, Any]]:
-        if not self.cache_path.exists():
+        """Return cached products, re-reading the files only when they changed on disk."""
+        stamp = self._stat_cache_files()
+        if stamp is None:
+            self._set_cache_mem(None)
+            self._cache_full_ts = None
             return []
+        if self._cache_mem is not None and stamp == self._cache_stamp:
+            return self._cache_mem
         try:
-            with self.cache_path.open("r", encoding="utf-8") as f:
-                data = json.load(f)
-            if isinstance(data, list):
-                return data
+            data = json.loads(self.cache_path.read_bytes())
         except Exception:
+            data = None
+        if not isinstance(data, list):
+            self._cache_full_ts = None
             return []
-        return []
+        self._set_cache_mem(data, stamp)
+        self._fold_into_mem(self._read_cache_log())
+        self._cache_full_ts = self._read_cache_meta()
+        return self._cache_mem
 
-    def save_cache(self, products: list[dict[str, Any]]) -> None:
+    def save_cache(self, products: list[dict[str, Any]], full: bool = False) -> None:
+        """
+        Write a full snapshot; this also compacts away the merge log.
+        Pass full=True only when `products` is the entire catalogue from the DB.
+        """
+        if not full:
+            # Drop the flag before the snapshot changes so no reader trusts a partial list.
+            with contextlib.suppress(OSError):
+                self.cache_meta_path.unlink()
+            self._cache_full_ts = None
+        self._write_snapshot(products)
+        if full:
+            fetched_ts = time.time()
+            with contextlib.suppress(OSError):
+                self.cache_meta_path.write_text(json.dumps({"full": True, "ts": fetched_ts}))
+                self._cache_full_ts = fetched_ts
+
+    def _write_snapshot(self, products: list[dict[str, Any]]) -> None:
+        with contextlib.suppress(OSError):
+            self.cache_log_path.unlink()
+        if self._write_cache_file(products):
+            self._set_cache_mem(products, self._stat_cache_files())
+
+    def _read_cache_meta(self) -> float | None:
         try:
-            with self.cache_path.open("w", encoding="utf-8") as f:
-                json.dump(products, f, ensure_ascii=True, indent=2)
+            meta = json.loads(self.cache_meta_path.read_bytes())
+        except Exception:
+            return None
+        if not isinstance(meta, dict) or not meta.get("full"):
+            return None
+        ts = meta.get("ts")
+        return float(ts) if isinstance(ts, (int, float)) else None
+
+    def _cache_is_authoritative(self) -> bool:
+        ts = self._cache_full_ts
+        return ts is not None and time.time() - ts < CACHE_FULL_TTL_SECS
+
+    def _write_cache_file(self, products: list[dict[str, Any]]) -> bool:
+        try:
+            # Encode once and write in a single call; the file is machine-read only.
+            data = json.dumps(products, ensure_ascii=True, separators=(",", ":"))
+            # Write to a sibling temp file and swap it in so readers never see a partial file.
+            tmp_path = self.cache_path.with_suffix(".json.tmp")
+            tmp_path.write_text(data, encoding="utf-8")
+            os.replace(tmp_path, self.cache_path)
+            return True
         except Exception:
             # Silent fail to avoid blocking UI; caller may log if needed.
-            pass
+            return False
+
+    def _append_cache_log(self, products: list[dict[str, Any]]) -> bool:
+        try:
+            lines = "".join(
+                json.dumps(p, ensure_ascii=True, separators=(",", ":")) + "\n" for p in products
+            )
+            with self.cache_log_path.open("a", encoding="utf-8") as f:
+                f.write(lines)
+            return True
+        except Exception:
+            return False
+
+    def _read_cache_log(self) -> list[dict[str, Any]]:
+        try:
+            raw = self.cache_log_path.read_bytes()
+        except OSError:
+            return []
+        entries = []
+        for line in raw.splitlines():
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # Torn line from an interrupted append; later lines are still usable.
+                continue
+            if isinstance(entry, dict):
+                entries.append(entry)
+        return entries
+
+    def _cache_log_needs_compaction(self) -> bool:
+        try:
+            log_size = self.cache_log_path.stat().st_size
+            snapshot_size = self.cache_path.stat().st_size
+        except OSError:
+            return False
+        return log_size * 10 > snapshot_size
+
+    def _set_cache_mem(
+        self,
+        products: list[dict[str, Any]] | None,
+        stamp: tuple[float, float] | None = None,
+    ) -> None:
+        """Adopt `products` as the in-memory cache and build the barcode index once."""
+        self._cache_mem = products
+        self._cache_stamp = stamp
+        # Barcodes are strings once normalized; str() only guards cache files from older builds.
+        self._cache_index = {str(p["barcode"]): p for p in products or [] if p.get("barcode")}
+        self._search_keys = None
+
+    def _fold_into_mem(self, products: list[dict[str, Any]]) -> None:
+        """Apply products to the in-memory cache; a known barcode is replaced in place."""
+        if not products:
+            return
+        if self._cache_mem is None:
+            self._cache_mem = []
+        mem = self._cache_mem
+        index = self._cache_index
+        positions: dict[int, int] | None = None
+        for product in products:
+            barcode = product.get("barcode")
+            if not barcode:
+                continue
+            barcode = str(barcode)
+            old = index.get(barcode)
+            if old is None:
+                if positions is not None:
+                    positions[id(product)] = len(mem)
+                mem.append(product)
+            else:
+                # Only built when a replacement is needed; scan-driven merges are pure appends.
+                if positions is None:
+                    positions = {id(p): i for i, p in enumerate(mem)}
+                pos = positions.pop(id(old))
+                mem[pos] = product
+                positions[id(product)] = pos
+            index[barcode] = product
+        self._search_keys = None
 
     def _find_in_cache_by_barcode(self, barcode: str) -> dict[str, Any] | None:
         if not barcode:
             return None
-        for product in self.load_cache():
-            if str(product.get("barcode")) == str(barcode):
-                return product
-        return None
+        self.load_cache()
+        return self._cache_index.get(str(barcode))
 
     def search_cache(self, query: str, limit: int = 10) -> list[dict[str, Any]]:
         if not query:
             return []
         query_lower = query.lower()
+        self.load_cache()
         results = []
-        for product in self.load_cache():
-            name = str(product.get("name", "")).lower()
-            barcode = str(product.get("barcode", "")).lower()
-            if query_lower in name or query_lower in barcode:
+        for haystack, product in self._get_search_keys():
+            if query_lower in haystack:
                 results.append(product)
-            if len(results) >= limit:
-                break
+                if len(results) >= limit:
+                    break
         return results
 
+    def _get_search_keys(self) -> list[tuple[str, dict[str, Any]]]:
+        """Lowercased name and barcode per cached product, built once per cache load."""
+        if self._search_keys is None:
+            self._search_keys = [
+                (f"{str(p.get('name') or '').lower()}\0{str(p.get('barcode') or '').lower()}", p)
+                for p in self._cache_mem or []
+            ]
+        return self._search_keys
+
     def get_cached_product(self, barcode: str) -> dict[str, Any] | None:
         """Public helper to fetch a single product from cache by barcode."""
         return self._find_in_cache_by_barcode(barcode)
 
+    def cache_snapshot(self) -> dict[str, dict[str, Any]]:
+        """Barcode -> product map of the current cache, by reference; callers must not mutate it."""
+        self.load_cache()
+        return self._cache_index
+
     def refresh_cache(self) -> list[dict[str, Any]]:
         """Force refresh of cache from DB."""
         return self.prime_cache(force_refresh=True)
@@ -269,10 +627,7 @@ class ProductModel:
             WHERE username = %s AND password = %s AND status = 'active'
             LIMIT 1
         """
-        with self._staff_cursor() as cur:
-            cur.execute(sql, (username, password))
-            row = cur.fetchone()
-        return dict(row) if row else None
+        return self._fetch_one(self._staff_checkout, sql, (username, password))
 
     def get_today_attendance(self, staff_id: int) -> dict[str, Any] | None:
         sql = """
@@ -293,20 +648,10 @@ class ProductModel:
             INSERT INTO attendance (staff_id, time_in, date, paid, salary, job)
             VALUES (%s, CURTIME(), CURDATE(), 0, %s, %s)
         """
-        conn = self._staff_pool_connect()
-        conn.start_transaction()
-        cur = conn.cursor()
-        try:
+        with self._tx_cursor(self._staff_checkout) as cur:
             cur.execute(sql, (staff_id, salary, job_json))
             attendance_id = cur.lastrowid
-            conn.commit()
-            return attendance_id
-        except mysql.connector.Error as exc:  # type: ignore
-            conn.rollback()
-            raise DatabaseError(str(exc)) from exc
-        finally:
-            cur.close()
-            conn.close()
+        return attendance_id
 
     def clock_out(self, attendance_id: int) -> bool:
         sql = """
@@ -314,19 +659,56 @@ class ProductModel:
             SET time_out = CURTIME()
             WHERE id = %s
         """
-        conn = self._staff_pool_connect()
-        conn.start_transaction()
-        cur = conn.cursor()
-        try:
+        with self._tx_cursor(self._staff_checkout) as cur:
             cur.execute(sql, (attendance_id,))
-            conn.commit()
-            return cur.rowcount > 0
-        except mysql.connector.Error as exc:  # type: ignore
-            conn.rollback()
-            raise DatabaseError(str(exc)) from exc
-        finally:
-            cur.close()
-            conn.close()
+            updated = cur.rowcount > 0
+        return updated
+
+    def authenticate_and_toggle_clock(self, username: str, password: str, role: str) -> dict[str, Any] | None:
+        """
+        Verify credentials and clock the staff member in or out in one transaction.
+        The staff row and today's latest attendance come back from a single locking read.
+        Returns None for bad credentials, else {"staff", "attendance_id", "action", "updated"}
+        where action is "in" or "out".
+        """
+        lookup_sql = """
+            SELECT s.id, s.username, s.role, s.status, s.name, s.branch, s.salary,
+                   a.id AS attendance_id, a.time_out AS attendance_time_out
+            FROM staff s
+            LEFT JOIN attendance a ON a.id = (
+                SELECT id FROM attendance
+                WHERE staff_id = s.id AND date = CURDATE()
+                ORDER BY id DESC
+                LIMIT 1
+            )
+            WHERE s.username = %s AND s.password = %s AND s.status = 'active'
+            LIMIT 1
+            FOR UPDATE
+        """
+        with self._tx_cursor(self._staff_checkout, dictionary=True) as cur:
+            cur.execute(lookup_sql, (username, password))
+            row = cur.fetchone()
+            if not row:
+                return None
+            staff = dict(row)
+            attendance_id = staff.pop("attendance_id")
+            time_out = staff.pop("attendance_time_out")
+            if attendance_id is not None and time_out is None:
+                cur.execute("UPDATE attendance SET time_out = CURTIME() WHERE id = %s", (attendance_id,))
+                return {
+                    "staff": staff,
+                    "attendance_id": attendance_id,
+                    "action": "out",
+                    "updated": cur.rowcount > 0,
+                }
+            cur.execute(
+                """
+                INSERT INTO attendance (staff_id, time_in, date, paid, salary, job)
+                VALUES (%s, CURTIME(), CURDATE(), 0, %s, %s)
+                """,
+                (staff["id"], float(staff.get("salary") or 0.0), json.dumps({"role": role})),
+            )
+            return {"staff": staff, "attendance_id": cur.lastrowid, "action": "in", "updated": True}
 
     def list_active_staff(self) -> list[dict[str, Any]]:
         sql = """
@@ -335,7 +717,7 @@ class ProductModel:
             WHERE status = 'active'
             ORDER BY name ASC
         """
-        with self._staff_cursor() as cur:
+        with self._staff_cursor(buffered=True) as cur:
             cur.execute(sql)
             rows = cur.fetchall() or []
         return [dict(r) for r in rows]
@@ -347,63 +729,78 @@ class ProductModel:
         """
         if not items:
             return False
-        conn = self._pool_connect()
-        conn.start_transaction()
-        cur = conn.cursor()
-        try:
-            for item in items:
-                sale_id = self._generate_id()
-                cur.execute(
-                    """
-                    INSERT INTO sales (id, prod_id, method_type, amount, qty)
-                    VALUES (%s, %s, %s, %s, %s)
-                    """,
-                    (
-                        sale_id,
-                        item.get("id"),
-                        method,
-                        item.get("amount", 0.0),
-                        item.get("qty", 0.0),
-                    ),
-                )
-                deduct_unit = float(item.get("deduct_unit") or 1.0)
-                qty = float(item.get("qty") or 0.0)
+        sale_rows = [
+            (
+                self._generate_id(),
+                item.get("id"),
+                method,
+                item.get("amount", 0.0),
+                item.get("qty", 0.0),
+            )
+            for item in items
+        ]
+        # Sum stock deltas per product so repeated lines collapse into one CASE branch.
+        deltas: dict[Any, float] = {}
+        for item in items:
+            prod_id = item.get("id")
+            if prod_id is None:
+                continue
+            deduct_unit = float(item.get("deduct_unit") or 1.0)
+            qty = float(item.get("qty") or 0.0)
+            deltas[prod_id] = deltas.get(prod_id, 0.0) + qty * deduct_unit
+
+        with self._tx_cursor(self._checkout) as cur:
+            cur.executemany(
+                """
+                INSERT INTO sales (id, prod_id, method_type, amount, qty)
+                VALUES (%s, %s, %s, %s, %s)
+                """,
+                sale_rows,
+            )
+            if deltas:
+                cases = " ".join("WHEN %s THEN %s" for _ in deltas)
+                placeholders = ", ".join("%s" for _ in deltas)
+                params = [value for pair in deltas.items() for value in pair]
+                params.extend(deltas)
                 cur.execute(
-                    """
+                    f"""
                     UPDATE products
-                    SET stock = GREATEST(0, stock - %s)
-                    WHERE id = %s
+                    SET stock = GREATEST(0, stock - CASE id {cases} ELSE 0 END)
+                    WHERE id IN ({placeholders})
                     """,
-                    (qty * deduct_unit, item.get("id")),
+                    params,
                 )
-            conn.commit()
-            return True
-        except mysql.connector.Error as exc:  # type: ignore
-            conn.rollback()
-            raise DatabaseError(str(exc)) from exc
-        finally:
-            cur.close()
-            conn.close()
+        return True
 
     def _generate_id(self) -> int:
-        return int(time.time() * 1000) + random.randint(1, 999)
+        return next(ProductModel._id_counter)
 
     def _merge_into_cache(self, products: list[dict[str, Any]]) -> None:
-        """Merge products into cache by barcode to avoid duplicates."""
+        """Merge products into cache by barcode; appends to the log instead of rewriting."""
         if not products:
             return
-        cache = {str(p.get("barcode")): p for p in self.load_cache() if p.get("barcode")}
-        for product in products:
-            barcode = str(product.get("barcode"))
-            if barcode:
-                cache[barcode] = product
-        self.save_cache(list(cache.values()))
+        self.load_cache()
+        self._fold_into_mem(products)
+        if self._cache_stamp is None:
+            # No snapshot yet: write one so the log always has a base to replay onto.
+            self.save_cache(self._cache_mem or [])
+            return
+        if not self._append_cache_log(products):
+            return
+        if self._cache_log_needs_compaction():
+            # Merged rows came from the DB, so compaction keeps any completeness flag.
+            self._write_snapshot(self._cache_mem or [])
+        else:
+            self._cache_stamp = self._stat_cache_files()
 
     def _normalize_product(self, row: dict[str, Any]) -> dict[str, Any]:
-        """Coerce decimals to float for UI friendliness."""
+        """Coerce decimals to float for UI friendliness and stamp the fetch time."""
         if not row:
             return {}
         normalized = dict(row)
+        normalized["_fetched_ts"] = time.time()
+        if normalized.get("barcode") is not None:
+            normalized["barcode"] = str(normalized["barcode"])
         for key in ("stock", "cost_price", "sell_price", "gst_rate"):
             if key in normalized and normalized[key] is not None:
                 try:
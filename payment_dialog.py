@@ -11,6 +11,7 @@ class PaymentDialog(QtWidgets.QDialog):
         self.selected_method = "cash"
         self.tendered_amount: float | None = None
         self.total = total
+        self._last_change_cents: int | None = None
         self._apply_style()
         self._build_ui()
         self._update_change()
@@ -21,12 +22,12 @@ class PaymentDialog(QtWidgets.QDialog):
         layout.setContentsMargins(16, 16, 16, 16)
 
         title = QtWidgets.QLabel("Complete Payment")
-        title.setStyleSheet("font-size:18px; font-weight:800;")
+        title.setProperty("heading", True)
         layout.addWidget(title)
 
-        total_label = QtWidgets.QLabel(f"Total due: ${self.total:.2f}")
-        total_label.setStyleSheet("font-size:16px; font-weight:700; color:#0f172a;")
-        layout.addWidget(total_label)
+        self.total_label = QtWidgets.QLabel(f"Total due: ${self.total:.2f}")
+        self.total_label.setProperty("totalDue", True)
+        layout.addWidget(self.total_label)
 
         method_box = QtWidgets.QGroupBox("Method")
         method_layout = QtWidgets.QHBoxLayout(method_box)
@@ -65,6 +66,17 @@ class PaymentDialog(QtWidgets.QDialog):
         btn_row.addWidget(self.ok_btn)
         layout.addLayout(btn_row)
 
+    def reset(self, total: float) -> None:
+        """Prepare the dialog for a new sale so one instance can be reused."""
+        self.total = total
+        self.selected_method = "cash"
+        self.tendered_amount = None
+        self._last_change_cents = None
+        self.total_label.setText(f"Total due: ${total:.2f}")
+        self.cash_radio.setChecked(True)
+        self.cash_input.setValue(0)
+        self._update_change()
+
     def accept(self) -> None:  # type: ignore[override]
         self.selected_method = "cash" if self.cash_radio.isChecked() else "card"
         if self.selected_method == "cash":
@@ -82,14 +94,19 @@ class PaymentDialog(QtWidgets.QDialog):
         self._update_change()
 
     def _update_change(self) -> None:
-        if not self.cash_radio.isChecked():
-            self.change_label.setText("$0.00")
-            self.ok_btn.setEnabled(True)
-            return
-        tendered = float(self.cash_input.value())
-        change = max(0.0, tendered - self.total)
-        self.change_label.setText(f"${change:.2f}")
-        self.ok_btn.setEnabled(tendered >= self.total)
+        if self.cash_radio.isChecked():
+            tendered = float(self.cash_input.value())
+            cents = max(0, round((tendered - self.total) * 100))
+            can_submit = tendered >= self.total
+        else:
+            cents = 0
+            can_submit = True
+        # valueChanged fires per keystroke; only touch the widgets when the output changes.
+        if cents != self._last_change_cents:
+            self._last_change_cents = cents
+            self.change_label.setText(f"${cents / 100:.2f}")
+        if can_submit != self.ok_btn.isEnabled():
+            self.ok_btn.setEnabled(can_submit)
 
     def _apply_style(self) -> None:
         self.setStyleSheet(
@@ -108,6 +125,14 @@ class PaymentDialog(QtWidgets.QDialog):
                 font-size: 13px;
                 color: #0f172a;
             }
+            QLabel[heading="true"] {
+                font-size: 18px;
+                font-weight: 800;
+            }
+            QLabel[totalDue="true"] {
+                font-size: 16px;
+                font-weight: 700;
+            }
             QLabel[highlight="true"] {
                 font-size: 18px;
                 font-weight: 800;
@@ -30,6 +30,11 @@ class PasswordDialog(QtWidgets.QDialog):
         btn_row.addWidget(ok_btn)
         layout.addLayout(btn_row)
 
+    def reset(self, username: str = "") -> None:
+        """Prepare the dialog for another clock action so one instance can be reused."""
+        self.user_input.setText(username)
+        self.pass_input.clear()
+
     def get_username(self) -> str:
         return self.user_input.text().strip()
 
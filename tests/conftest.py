@@ -0,0 +1,5 @@
+import pathlib
+import sys
+
+# The app modules live at the repository root rather than in a package.
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
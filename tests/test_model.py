@@ -0,0 +1,145 @@
+import contextlib
+import json
+
+import pytest
+
+mysql_connector = pytest.importorskip("mysql.connector")
+
+from model import DatabaseError, ProductModel  # noqa: E402
+
+
+class FakeCursor:
+    def __init__(self, raw, rows):
+        self.raw = raw
+        self.rows = rows
+        self.rowcount = 1
+        self.lastrowid = 42
+
+    def execute(self, sql, params=()):
+        # Record whether each statement ran with autocommit off on the real connection.
+        self.raw.log.append((" ".join(sql.split()).split(" ")[0], self.raw.autocommit))
+
+    def fetchone(self):
+        return self.rows.pop(0) if self.rows else None
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    """Stands in for the driver connection a pool hands out."""
+
+    def __init__(self, rows=None):
+        self.autocommit = True
+        self.rows = list(rows or [])
+        self.log = []
+
+    def cursor(self, **kwargs):
+        return FakeCursor(self, self.rows)
+
+    def commit(self):
+        self.log.append("COMMIT")
+
+    def rollback(self):
+        self.log.append("ROLLBACK")
+
+
+class FakePooledConnection:
+    """Like PooledMySQLConnection: reads are forwarded to `_cnx`, writes are not."""
+
+    def __init__(self, cnx):
+        self._cnx = cnx
+
+    def __getattr__(self, attr):
+        return getattr(self._cnx, attr)
+
+    def close(self):
+        pass
+
+
+def checkout_for(raw):
+    @contextlib.contextmanager
+    def checkout():
+        yield FakePooledConnection(raw)
+
+    return checkout
+
+
+def test_tx_cursor_turns_off_autocommit_on_the_pooled_connection():
+    raw = FakeConnection()
+    with ProductModel()._tx_cursor(checkout_for(raw)) as cur:
+        assert raw.autocommit is False
+        cur.execute("UPDATE products SET stock = 1")
+    assert raw.log == [("UPDATE", False), "COMMIT"]
+    assert raw.autocommit is True
+
+
+def test_tx_cursor_rolls_back_and_restores_autocommit_on_error():
+    raw = FakeConnection()
+    with pytest.raises(DatabaseError):
+        with ProductModel()._tx_cursor(checkout_for(raw)) as cur:
+            cur.execute("INSERT INTO sales VALUES (1)")
+            raise mysql_connector.Error("boom")
+    assert raw.log == [("INSERT", False), "ROLLBACK"]
+    assert raw.autocommit is True
+
+
+def test_load_cache_replays_a_log_that_replaces_then_appends_then_replaces(tmp_path):
+    cache_path = tmp_path / "products_cache.json"
+    cache_path.write_text(json.dumps([{"barcode": "P", "stock": 1}]))
+    log_entries = [
+        {"barcode": "P", "stock": 2},
+        {"barcode": "Q", "stock": 5},
+        {"barcode": "Q", "stock": 4},
+    ]
+    cache_path.with_suffix(".log.jsonl").write_text(
+        "".join(json.dumps(entry) + "\n" for entry in log_entries)
+    )
+    model = ProductModel()
+    model.cache_path = cache_path
+
+    products = model.load_cache()
+
+    assert products == [{"barcode": "P", "stock": 2}, {"barcode": "Q", "stock": 4}]
+    assert model.get_cached_product("Q") == {"barcode": "Q", "stock": 4}
+
+
+STAFF_ROW = {
+    "id": 3,
+    "username": "ann",
+    "role": "Cashier",
+    "status": "active",
+    "name": "Ann",
+    "branch": "B",
+    "salary": 12,
+}
+
+
+@pytest.mark.parametrize(
+    ("attendance", "action", "write"),
+    [
+        ({"attendance_id": None, "attendance_time_out": None}, "in", "INSERT"),
+        ({"attendance_id": 9, "attendance_time_out": None}, "out", "UPDATE"),
+        ({"attendance_id": 9, "attendance_time_out": "17:00"}, "in", "INSERT"),
+    ],
+)
+def test_clock_toggle_locks_and_writes_in_one_transaction(attendance, action, write):
+    raw = FakeConnection(rows=[{**STAFF_ROW, **attendance}])
+    model = ProductModel()
+    model._staff_checkout = checkout_for(raw)
+
+    result = model.authenticate_and_toggle_clock("ann", "pw", "Manager")
+
+    assert result["action"] == action
+    # Autocommit stays off from the locking SELECT through the write, so the lock holds.
+    assert raw.log == [("SELECT", False), (write, False), "COMMIT"]
+    assert raw.autocommit is True
+
+
+def test_clock_toggle_returns_none_for_bad_credentials():
+    raw = FakeConnection()
+    model = ProductModel()
+    model._staff_checkout = checkout_for(raw)
+
+    assert model.authenticate_and_toggle_clock("ann", "wrong", "Manager") is None
+    assert raw.log == [("SELECT", False), "COMMIT"]
@@ -4,12 +4,22 @@ Run: source .venv/bin/activate && python uipos.py
 """
 
 import contextlib
+import functools
 import json
+import re
+import select
 import socket
 import sys
+import threading
+import time
 from typing import Any
 from PyQt5 import QtCore, QtGui, QtWidgets
 
+try:
+    import orjson
+except ImportError:  # optional; Linkly messages fall back to the stdlib json module
+    orjson = None
+
 from model import DatabaseError, ProductModel
 from payment_dialog import PaymentDialog
 from staff_dialog import PasswordDialog
@@ -17,23 +27,433 @@ from staff_dialog import PasswordDialog
 LINKLY_HOST = "127.0.0.1"
 LINKLY_PORT = 2005
 LINKLY_TIMEOUT_SECS = 15
+LINKLY_MAX_RESPONSE_BYTES = 65536
+# Constant fields of a Linkly SALE request; the rest are filled in per sale, keeping this key order.
+LINKLY_SALE_TEMPLATE: dict[str, Any] = {
+    "type": "SALE",
+    "reference": "",
+    "amount_cents": 0,
+    "amount": 0.0,
+    "currency": "MYR",
+    "sub_total": 0.0,
+    "discount_total": 0.0,
+    "gst_total": 0.0,
+    "items": [],
+    "operator": None,
+    "terminal": "",
+}
+LINKLY_ITEM_KEYS = ("name", "barcode", "qty", "price", "amount")
+# Status words looked for in a plain-text (non-JSON) Linkly reply.
+LINKLY_RESPONSE_KEYWORDS_RE = re.compile(rb"APPROVED|SUCCESS|DECLINED|FAILED|ERROR", re.IGNORECASE)
+LINKLY_APPROVED_KEYWORDS = frozenset((b"APPROVED", b"SUCCESS"))
+SEARCH_ROW_FORMAT = "{name}  [{barcode}]  RM {price:.2f}".format
+# With no local sales since the last refresh, the timer refetches at most this often.
+CACHE_IDLE_REFRESH_SECS = 300
+
+# Action panel label -> POSWindow method; buttons not listed here are not wired up yet.
+ACTION_HANDLERS = {
+    "Search Stock": "open_search_dialog",
+    "Void Item": "void_selected_item",
+    "Void All Items": "void_all_items",
+    "Payment": "handle_payment",
+}
+
+# Every background/text colour handed to _pill_button; each gets one property rule below.
+PILL_COLORS = (
+    "#0ea5e9", "#0f172a", "#10b981", "#14b8a6", "#22c55e", "#23c16b", "#2563eb",
+    "#38bdf8", "#3b82f6", "#4d87ff", "#6366f1", "#6b7280", "#7048e8", "#8b5cf6",
+    "#94a3b8", "#e5e7eb", "#ef4444", "#f1f5f9", "#f2c94c", "#f59e0b", "#f97316",
+    "#facc15", "#ff8a3d", "#ff9f43", "#ffffff",
+)
+
+PILL_STYLESHEET = (
+    """
+    QPushButton[pill="true"] {
+        border: none;
+        border-radius: 10px;
+        padding: 10px 14px;
+        font-weight: 500;
+    }
+    QPushButton[pill="true"][bold="true"] {
+        font-weight: 600;
+    }
+    QPushButton[pill="true"]:hover {
+        border: 1px solid #cbd5e1;
+    }
+    QPushButton[pill="true"][category="true"] {
+        border: 1px solid #d9dde5;
+        border-radius: 12px;
+        padding: 14px;
+        text-align: left;
+        font-weight: 700;
+        letter-spacing: 0.2px;
+    }
+    QPushButton[pill="true"][category="true"]:hover {
+        border: 1px solid #cbd5e1;
+    }
+    """
+    + "".join(f'QPushButton[pillBg="{c[1:]}"] {{ background-color: {c}; }}\n' for c in PILL_COLORS)
+    + "".join(f'QPushButton[pillFg="{c[1:]}"] {{ color: {c}; }}\n' for c in PILL_COLORS)
+)
 
 
 class LinklyError(Exception):
     """Raised when Linkly payment messaging fails."""
 
 
+class _CacheRefreshSignals(QtCore.QObject):
+    finished = QtCore.pyqtSignal(object)
+    failed = QtCore.pyqtSignal(str)
+
+
+class CacheRefreshTask(QtCore.QRunnable):
+    """Fetch the full product list off the GUI thread; results arrive via `signals`."""
+
+    def __init__(self, model: ProductModel) -> None:
+        super().__init__()
+        self.model = model
+        self.signals = _CacheRefreshSignals()
+
+    def run(self) -> None:
+        try:
+            products = self.model.fetch_all_products()
+        except Exception as exc:
+            self.signals.failed.emit(str(exc))
+            return
+        self.signals.finished.emit(products)
+
+
+class _RecordSaleSignals(QtCore.QObject):
+    finished = QtCore.pyqtSignal(bool)
+    failed = QtCore.pyqtSignal(str)
+
+
+class RecordSaleTask(QtCore.QRunnable):
+    """Store a completed sale off the GUI thread; the outcome arrives via `signals`."""
+
+    def __init__(self, model: ProductModel, items: list[dict[str, Any]], method: str) -> None:
+        super().__init__()
+        self.model = model
+        self.items = items
+        self.method = method
+        self.signals = _RecordSaleSignals()
+
+    def run(self) -> None:
+        try:
+            saved = self.model.record_sale(self.items, self.method)
+        except Exception as exc:
+            self.signals.failed.emit(str(exc))
+            return
+        self.signals.finished.emit(bool(saved))
+
+
+class _LinklySignals(QtCore.QObject):
+    finished = QtCore.pyqtSignal(bytes)
+    failed = QtCore.pyqtSignal(str)
+
+
+class LinklyTask(QtCore.QRunnable):
+    """Send one encoded Linkly message off the GUI thread; the reply arrives via `signals`."""
+
+    def __init__(self, connection: "LinklyConnection", message: bytes) -> None:
+        super().__init__()
+        self.connection = connection
+        self.message = message
+        self.signals = _LinklySignals()
+
+    def run(self) -> None:
+        try:
+            response = self.connection.send(self.message)
+        except LinklyError as exc:
+            self.signals.failed.emit(str(exc))
+            return
+        self.signals.finished.emit(response)
+
+
+class LinklyConnection:
+    """One long-lived socket to the Linkly terminal, reused across card payments."""
+
+    def __init__(self) -> None:
+        self._sock: socket.socket | None = None
+        self._lock = threading.Lock()
+        # Replies are read into this one buffer instead of a list of per-recv chunks.
+        self._buf = bytearray(LINKLY_MAX_RESPONSE_BYTES)
+
+    def send(self, message: bytes) -> bytes:
+        with self._lock:
+            try:
+                sock = self._idle_socket()
+                if sock is not None:
+                    try:
+                        sock.sendall(message)
+                    except OSError:
+                        # Dropped while idle; nothing reached the terminal, so a resend is safe.
+                        self._close()
+                        sock = None
+                if sock is None:
+                    sock = self._connect()
+                    sock.sendall(message)
+                raw = self._read_line(sock, time.monotonic() + LINKLY_TIMEOUT_SECS)
+            except OSError as exc:
+                self._close()
+                raise LinklyError(f"Linkly connection failed: {exc}") from exc
+            except LinklyError:
+                # The rest of the reply may still arrive; never let it answer the next sale.
+                self._close()
+                raise
+            if b"\n" not in raw:
+                # The terminal closed the connection to end its reply.
+                self._close()
+            return raw.strip()
+
+    def close(self) -> None:
+        with self._lock:
+            self._close()
+
+    def _connect(self) -> socket.socket:
+        sock = socket.create_connection((LINKLY_HOST, LINKLY_PORT), timeout=LINKLY_TIMEOUT_SECS)
+        _tune_linkly_socket(sock)
+        self._sock = sock
+        return sock
+
+    def _idle_socket(self) -> socket.socket | None:
+        """Return the open socket after discarding stray bytes, or None if the peer hung up."""
+        sock = self._sock
+        if sock is None:
+            return None
+        while select.select([sock], [], [], 0)[0]:
+            try:
+                data = sock.recv(4096)
+            except OSError:
+                data = b""
+            if not data:
+                self._close()
+                return None
+        return sock
+
+    def _read_line(self, sock: socket.socket, deadline: float) -> bytes:
+        """Read up to the first newline or until the terminal hangs up.
+
+        Raises LinklyError at `deadline`, however slowly bytes trickle in, or once the
+        buffer fills, rather than handing back a partial reply.
+        """
+        view = memoryview(self._buf)
+        size = 0
+        while size < len(view):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise LinklyError("Linkly read timed out.")
+            readable, _, _ = select.select([sock], [], [], remaining)
+            if not readable:
+                raise LinklyError("Linkly read timed out.")
+            count = sock.recv_into(view[size:])
+            if not count:
+                break
+            newline = self._buf.find(b"\n", size, size + count)
+            size += count
+            if newline != -1:
+                # Anything after the newline is not part of this reply.
+                return bytes(view[: newline + 1])
+        else:
+            raise LinklyError("Linkly response too large.")
+        return bytes(view[:size])
+
+    def _close(self) -> None:
+        if self._sock is not None:
+            with contextlib.suppress(OSError):
+                self._sock.close()
+            self._sock = None
+
+
+def _tune_linkly_socket(sock: socket.socket) -> None:
+    # Each request is one small frame followed by a wait for the reply, which is exactly
+    # where Nagle's algorithm stalls on the peer's delayed ACK.
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+
+
+class BusyOverlay(QtWidgets.QWidget):
+    """Translucent cover drawn inside the window while a sale is saved or sent to the terminal."""
+
+    def __init__(self, parent: QtWidgets.QWidget) -> None:
+        super().__init__(parent)
+        # Takes focus while shown so keystrokes cannot reach the widgets underneath.
+        self.setFocusPolicy(QtCore.Qt.StrongFocus)
+        self._label = QtWidgets.QLabel(self)
+        self._label.setObjectName("BusyLabel")
+        self._label.setAlignment(QtCore.Qt.AlignCenter)
+        layout = QtWidgets.QVBoxLayout(self)
+        layout.addWidget(self._label, 0, QtCore.Qt.AlignCenter)
+        parent.installEventFilter(self)
+        self.hide()
+
+    def set_text(self, text: str) -> None:
+        self._label.setText(text)
+
+    def showEvent(self, event: QtGui.QShowEvent) -> None:
+        self.setGeometry(self.parentWidget().rect())
+        self.raise_()
+        self.setFocus()
+        super().showEvent(event)
+
+    def eventFilter(self, obj: QtCore.QObject, event: QtCore.QEvent) -> bool:
+        if obj is self.parentWidget() and event.type() == QtCore.QEvent.Resize:
+            self.setGeometry(obj.rect())
+        return super().eventFilter(obj, event)
+
+    def paintEvent(self, event: QtGui.QPaintEvent) -> None:
+        painter = QtGui.QPainter(self)
+        painter.fillRect(self.rect(), QtGui.QColor(15, 23, 42, 110))
+
+    def keyPressEvent(self, event: QtGui.QKeyEvent) -> None:
+        event.accept()
+
+
+class CartModel(QtCore.QAbstractTableModel):
+    """Cart lines behind the sale table; each line is {"product", "qty", "price"}."""
+
+    HEADERS = ("Description", "Qty", "Price", "Amount")
+
+    def __init__(self, parent: QtCore.QObject | None = None) -> None:
+        super().__init__(parent)
+        self._lines: list[dict[str, Any]] = []
+        self._rows_by_barcode: dict[str, int] = {}
+        # Running sum of qty * price, adjusted by each mutation instead of rescanning lines.
+        self.total = 0.0
+
+    def rowCount(self, parent: QtCore.QModelIndex = QtCore.QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self._lines)
+
+    def columnCount(self, parent: QtCore.QModelIndex = QtCore.QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def data(self, index: QtCore.QModelIndex, role: int = QtCore.Qt.DisplayRole) -> Any:
+        if not index.isValid() or role != QtCore.Qt.DisplayRole:
+            return None
+        return self._lines[index.row()]["text"][index.column()]
+
+    def headerData(
+        self,
+        section: int,
+        orientation: QtCore.Qt.Orientation,
+        role: int = QtCore.Qt.DisplayRole,
+    ) -> Any:
+        if role == QtCore.Qt.DisplayRole and orientation == QtCore.Qt.Horizontal:
+            return self.HEADERS[section]
+        return None
+
+    def lines(self) -> list[dict[str, Any]]:
+        return self._lines
+
+    def row_for_barcode(self, barcode: Any) -> int | None:
+        return self._rows_by_barcode.get(str(barcode)) if barcode else None
+
+    def add_line(self, product: dict[str, Any], qty: float, price: float) -> int:
+        row = len(self._lines)
+        self.beginInsertRows(QtCore.QModelIndex(), row, row)
+        line = {"product": product, "qty": qty, "price": price}
+        self._format_line(line)
+        self._lines.append(line)
+        barcode = product.get("barcode")
+        if barcode:
+            self._rows_by_barcode[str(barcode)] = row
+        self.total += qty * price
+        self.endInsertRows()
+        return row
+
+    def remove_line(self, row: int) -> None:
+        self.beginRemoveRows(QtCore.QModelIndex(), row, row)
+        line = self._lines.pop(row)
+        # Reset on empty so float drift from add/subtract cannot linger.
+        self.total = self.total - line["qty"] * line["price"] if self._lines else 0.0
+        # Later rows shift up by one; removals are rare next to scans, so just rebuild.
+        self._rows_by_barcode = {
+            str(line["product"]["barcode"]): row
+            for row, line in enumerate(self._lines)
+            if line["product"].get("barcode")
+        }
+        self.endRemoveRows()
+
+    def clear(self) -> None:
+        self.beginResetModel()
+        self._lines = []
+        self._rows_by_barcode = {}
+        self.total = 0.0
+        self.endResetModel()
+
+    def set_qty(self, row: int, qty: float) -> None:
+        line = self._lines[row]
+        self.total += (qty - line["qty"]) * line["price"]
+        line["qty"] = qty
+        self._format_line(line)
+        self._cells_changed(row, 1, 3)
+
+    def set_price(self, row: int, price: float) -> None:
+        line = self._lines[row]
+        self.total += line["qty"] * (price - line["price"])
+        line["price"] = price
+        self._format_line(line)
+        self._cells_changed(row, 2, 3)
+
+    def set_products(self, products_by_row: dict[int, dict[str, Any]]) -> None:
+        """Swap product metadata on many rows with a single dataChanged over the span."""
+        if not products_by_row:
+            return
+        for row, product in products_by_row.items():
+            line = self._lines[row]
+            line["product"] = product
+            self._format_line(line)
+        self.dataChanged.emit(
+            self.index(min(products_by_row), 0), self.index(max(products_by_row), 0)
+        )
+
+    @staticmethod
+    def _format_line(line: dict[str, Any]) -> None:
+        """Render the display strings once per edit; data() runs on every repaint."""
+        line["text"] = (
+            str(line["product"].get("name", "")),
+            f"{line['qty']:g}",
+            f"{line['price']:.2f}",
+            f"{line['qty'] * line['price']:.2f}",
+        )
+
+    def _cells_changed(self, row: int, first_col: int, last_col: int) -> None:
+        self.dataChanged.emit(self.index(row, first_col), self.index(row, last_col))
+
+
 class POSWindow(QtWidgets.QMainWindow):
     def __init__(self) -> None:
         super().__init__()
         self.setWindowTitle("Modern POS")
         self.resize(1400, 900)
         self.model: ProductModel | None = None
-        self.row_products: dict[int, dict[str, Any]] = {}
+        self.cart = CartModel(self)
         self.pad_mode: str | None = None
         self.pad_buffer: str = ""
         self.current_staff: dict[str, Any] | None = None
         self.current_attendance_id: int | None = None
+        self._cache_task: CacheRefreshTask | None = None
+        self._cache_refresh_quiet = True
+        self._cache_timer: QtCore.QTimer | None = None
+        self._cache_dirty = True
+        self._cache_refreshed_at = 0.0
+        self._linkly = LinklyConnection()
+        self._linkly_task: LinklyTask | None = None
+        self._sale_task: RecordSaleTask | None = None
+        self._busy: BusyOverlay | None = None
+        self._focus_before_busy: QtWidgets.QWidget | None = None
+        self._payment_dialog: PaymentDialog | None = None
+        self._password_dialog: PasswordDialog | None = None
+        self._search_dialog: SearchDialog | None = None
+        # Raw values behind the totals card; the labels only ever display these.
+        self._totals = {
+            "amount": 0.0,
+            "discount": 0.0,
+            "redeem": 0.0,
+            "voucher": 0.0,
+            "total": 0.0,
+            "gst": 0.0,
+        }
         self._build_ui()
         self._apply_styles()
         self._wire_clock()
@@ -49,10 +469,23 @@ class POSWindow(QtWidgets.QMainWindow):
         main_layout.setContentsMargins(18, 18, 18, 18)
         main_layout.setSpacing(14)
 
+        # The keypad and category grid are filled in once the event loop is running,
+        # so the window (and the scanner path through the table) paints first.
+        self._right_panel_slot = QtWidgets.QWidget()
+        self._right_panel_slot.setMaximumWidth(420)
         main_layout.addWidget(self._build_left_panel(), 3)
-        main_layout.addWidget(self._build_right_panel(), 1)
+        main_layout.addWidget(self._right_panel_slot, 1)
         main_layout.setStretch(0, 3)
         main_layout.setStretch(1, 1)
+        QtCore.QTimer.singleShot(0, self._finish_build_ui)
+
+    def _finish_build_ui(self) -> None:
+        for slot, build in (
+            (self._keypad_slot, self._build_keypad),
+            (self._right_panel_slot, self._build_right_panel),
+        ):
+            slot.parentWidget().layout().replaceWidget(slot, build())
+            slot.deleteLater()
 
     def _build_left_panel(self) -> QtWidgets.QWidget:
         panel = QtWidgets.QWidget()
@@ -85,10 +518,7 @@ class POSWindow(QtWidgets.QMainWindow):
         self.clock_button.setMinimumHeight(36)
         self.clock_button.setCursor(QtCore.Qt.PointingHandCursor)
         self.clock_button.clicked.connect(self.handle_clock_action)
-        self.clock_button.setStyleSheet(
-            "QPushButton {background:#2563eb; color:#fff; border:none; border-radius:8px; padding:8px 14px; font-weight:700;}"
-            "QPushButton:hover {background:#1d4ed8;}"
-        )
+        self.clock_button.setObjectName("ClockButton")
 
         self.customer_field = QtWidgets.QComboBox()
         self.customer_field.addItems(["Cash Customer", "Member", "Corporate", "Delivery"])
@@ -101,8 +531,8 @@ class POSWindow(QtWidgets.QMainWindow):
         return bar
 
     def _build_table(self) -> QtWidgets.QWidget:
-        table = QtWidgets.QTableWidget(11, 4)
-        table.setHorizontalHeaderLabels(["Description", "Qty", "Price", "Amount"])
+        table = QtWidgets.QTableView()
+        table.setModel(self.cart)
         table.horizontalHeader().setStretchLastSection(True)
         table.horizontalHeader().setSectionResizeMode(QtWidgets.QHeaderView.Stretch)
         table.verticalHeader().setVisible(False)
@@ -122,7 +552,8 @@ class POSWindow(QtWidgets.QMainWindow):
 
         bar.addWidget(self._build_action_panel(), 3)
         bar.addWidget(self._build_totals_card(), 2)
-        bar.addWidget(self._build_keypad(), 2)
+        self._keypad_slot = QtWidgets.QWidget()
+        bar.addWidget(self._keypad_slot, 2)
         return bar
 
     def _build_action_panel(self) -> QtWidgets.QWidget:
@@ -151,23 +582,24 @@ class POSWindow(QtWidgets.QMainWindow):
         grid.setContentsMargins(12, 12, 12, 12)
         grid.setSpacing(8)
 
+        self._action_group = QtWidgets.QButtonGroup(self)
+        self._action_group.setExclusive(False)
+        self._action_group.buttonClicked.connect(self._dispatch_action)
         for text, color, row, col, rowspan, colspan in buttons:
             height = 52
             if text == "Payment":
                 height = 110
             btn = self._pill_button(text, color, height=height, bold=True)
-            if text == "Search Stock":
-                btn.clicked.connect(self.open_search_dialog)
-            if text == "Void Item":
-                btn.clicked.connect(self.void_selected_item)
-            if text == "Void All Items":
-                btn.clicked.connect(self.void_all_items)
-            if text == "Payment":
-                btn.clicked.connect(self.handle_payment)
+            self._action_group.addButton(btn)
             grid.addWidget(btn, row, col, rowspan, colspan)
 
         return container
 
+    def _dispatch_action(self, button: QtWidgets.QAbstractButton) -> None:
+        handler = ACTION_HANDLERS.get(button.text())
+        if handler:
+            getattr(self, handler)()
+
     def _build_totals_card(self) -> QtWidgets.QWidget:
         container = QtWidgets.QFrame()
         container.setObjectName("Card")
@@ -250,15 +682,17 @@ class POSWindow(QtWidgets.QMainWindow):
         ]
         for text, row, col in numbers:
             btn = self._pill_button(text, "#f1f5f9", height=54, bold=True)
-            btn.clicked.connect(lambda _, t=text: self._pad_append(t))
+            btn.clicked.connect(self._on_pad_digit)
             layout.addWidget(btn, row, col)
 
         qty_btn = self._pill_button("Qty", "#2563eb", "#ffffff", height=54, bold=True)
-        qty_btn.clicked.connect(lambda: self._pad_set_mode("qty"))
+        qty_btn.setProperty("padMode", "qty")
+        qty_btn.clicked.connect(self._on_pad_mode)
         layout.addWidget(qty_btn, 2, 3)
 
         price_btn = self._pill_button("Price", "#2563eb", "#ffffff", height=54, bold=True)
-        price_btn.clicked.connect(lambda: self._pad_set_mode("price"))
+        price_btn.setProperty("padMode", "price")
+        price_btn.clicked.connect(self._on_pad_mode)
         layout.addWidget(price_btn, 3, 3)
 
         enter_btn = self._pill_button("Enter", "#0ea5e9", "#ffffff", height=54, bold=True)
@@ -294,19 +728,7 @@ class POSWindow(QtWidgets.QMainWindow):
         for idx, (text, bg, fg) in enumerate(categories):
             row, col = divmod(idx, columns)
             btn = self._pill_button(text, bg, fg, height=72, bold=True)
-            btn.setStyleSheet(
-                f"QPushButton {{"
-                f"background: {bg};"
-                f"color: {fg};"
-                "border: 1px solid #d9dde5;"
-                "border-radius: 12px;"
-                "padding: 14px;"
-                "text-align: left;"
-                "font-weight: 700;"
-                "letter-spacing: 0.2px;"
-                "}"
-                "QPushButton:hover {border: 1px solid #cbd5e1;}"
-            )
+            btn.setProperty("category", True)
             grid.addWidget(btn, row, col)
 
         for col in range(columns):
@@ -343,18 +765,11 @@ class POSWindow(QtWidgets.QMainWindow):
         btn = QtWidgets.QPushButton(text)
         btn.setCursor(QtCore.Qt.PointingHandCursor)
         btn.setMinimumHeight(height)
-        weight = "600" if bold else "500"
-        btn.setStyleSheet(
-            f"QPushButton {{"
-            f"background-color: {bg};"
-            f"color: {fg};"
-            f"border: none;"
-            f"border-radius: 10px;"
-            f"padding: 10px 14px;"
-            f"font-weight: {weight};"
-            f"}}"
-            "QPushButton:hover {border: 1px solid #cbd5e1;}"
-        )
+        # Styled by PILL_STYLESHEET through these properties; colours must be in PILL_COLORS.
+        btn.setProperty("pill", True)
+        btn.setProperty("bold", bold)
+        btn.setProperty("pillBg", bg.lstrip("#"))
+        btn.setProperty("pillFg", fg.lstrip("#"))
         return btn
 
     def _muted_label(self, text: str) -> QtWidgets.QLabel:
@@ -373,6 +788,26 @@ class POSWindow(QtWidgets.QMainWindow):
         now = QtCore.QDateTime.currentDateTime()
         self.clock_label.setText(now.toString("dd/MM/yyyy  hh:mm:ss"))
 
+    def showEvent(self, event: QtGui.QShowEvent) -> None:
+        self._update_clock()
+        self._clock_timer.start(1000)
+        if self._cache_timer is not None:
+            self._cache_timer.start(30_000)
+        super().showEvent(event)
+
+    def hideEvent(self, event: QtGui.QHideEvent) -> None:
+        # Nothing to repaint or refresh while minimised or hidden.
+        self._clock_timer.stop()
+        if self._cache_timer is not None:
+            self._cache_timer.stop()
+        super().hideEvent(event)
+
+    def closeEvent(self, event: QtGui.QCloseEvent) -> None:
+        # With a payment in flight the worker holds the connection; the process exit reclaims it.
+        if self._linkly_task is None:
+            self._linkly.close()
+        super().closeEvent(event)
+
     def _apply_styles(self) -> None:
         self.setStyleSheet(
             """
@@ -396,7 +831,7 @@ class POSWindow(QtWidgets.QMainWindow):
                 border-radius: 8px;
                 padding: 8px 10px;
             }
-            QTableWidget {
+            QTableView {
                 background: #ffffff;
                 border: 1px solid #dfe3eb;
                 border-radius: 10px;
@@ -418,12 +853,30 @@ class POSWindow(QtWidgets.QMainWindow):
                 font-size: 15px;
                 font-weight: 700;
             }
+            QPushButton#ClockButton {
+                background: #2563eb;
+                color: #fff;
+                border: none;
+                border-radius: 8px;
+                padding: 8px 14px;
+                font-weight: 700;
+            }
+            QPushButton#ClockButton:hover {
+                background: #1d4ed8;
+            }
             QLabel#TotalValue {
                 color: #ef4444;
                 font-size: 22px;
                 font-weight: 800;
             }
+            QLabel#BusyLabel {
+                background: #ffffff;
+                border-radius: 14px;
+                padding: 18px 28px;
+                font-weight: 700;
+            }
             """
+            + PILL_STYLESHEET
         )
 
     # --- Data / model helpers -------------------------------------------------
@@ -435,13 +888,11 @@ class POSWindow(QtWidgets.QMainWindow):
             return None
 
     def _warm_cache(self) -> None:
-        """Load cached products or fetch all from DB on startup for faster lookups."""
+        """Load cached products from disk; fetch from DB in the background if there are none."""
         if not self.model:
             return
-        try:
-            self.model.prime_cache()
-        except Exception as exc:
-            self._show_info(f"Cache warm-up skipped: {exc}")
+        if not self.model.load_cache():
+            self._refresh_cache(quiet=False)
         self._sync_row_products_from_cache()
         self._load_staff_options()
 
@@ -453,26 +904,54 @@ class POSWindow(QtWidgets.QMainWindow):
         timer.start(30_000)  # 30 seconds
         self._cache_timer = timer
 
-    def _refresh_cache(self) -> None:
-        if not self.model:
+    def _refresh_cache(self, quiet: bool = True) -> None:
+        """Refetch all products on the thread pool; lookups keep using the current cache."""
+        if not self.model or self._cache_task is not None:
             return
-        try:
-            self.model.refresh_cache()
-        except Exception:
+        if (
+            quiet
+            and not self._cache_dirty
+            and time.monotonic() - self._cache_refreshed_at < CACHE_IDLE_REFRESH_SECS
+        ):
             return
+        # Cleared up front so a sale recorded while the fetch runs marks it dirty again.
+        self._cache_dirty = False
+        task = CacheRefreshTask(self.model)
+        task.signals.finished.connect(self._on_cache_refreshed)
+        task.signals.failed.connect(self._on_cache_refresh_failed)
+        self._cache_task = task
+        self._cache_refresh_quiet = quiet
+        QtCore.QThreadPool.globalInstance().start(task)
+
+    def _on_cache_refreshed(self, products: list[dict[str, Any]]) -> None:
+        self._cache_task = None
+        self._cache_refreshed_at = time.monotonic()
+        if self.model:
+            self.model.save_cache(products, full=True)
         self._sync_row_products_from_cache()
+        self._invalidate_search_results()
+
+    def _invalidate_search_results(self) -> None:
+        if self._search_dialog is not None:
+            self._search_dialog.clear_cache()
+
+    def _on_cache_refresh_failed(self, message: str) -> None:
+        self._cache_task = None
+        self._cache_dirty = True
+        if not self._cache_refresh_quiet:
+            self._show_info(f"Cache warm-up skipped: {message}")
 
     def _sync_row_products_from_cache(self) -> None:
         """Update in-table product metadata from latest cache."""
         if not self.model:
             return
-        for row, product in list(self.row_products.items()):
-            barcode = product.get("barcode")
-            if not barcode:
-                continue
-            refreshed = self.model.get_cached_product(barcode)
-            if refreshed:
-                self.row_products[row] = refreshed
+        snapshot = self.model.cache_snapshot()
+        updates: dict[int, dict[str, Any]] = {}
+        for row, line in enumerate(self.cart.lines()):
+            refreshed = snapshot.get(str(line["product"].get("barcode")))
+            if refreshed is not None and refreshed is not line["product"]:
+                updates[row] = refreshed
+        self.cart.set_products(updates)
 
     def _load_staff_options(self) -> None:
         """Populate staff dropdown from staff DB."""
@@ -483,13 +962,16 @@ class POSWindow(QtWidgets.QMainWindow):
         except Exception as exc:
             self._show_info(f"Could not load staff: {exc}")
             return
-        self.staff_combo.clear()
-        self.staff_combo.addItem("Select staff", None)
-        for staff in staff_list:
-            label = staff.get("name") or staff.get("username") or "Unknown"
-            role = staff.get("role") or ""
-            display = f"{label} ({role})" if role else label
-            self.staff_combo.addItem(display, staff)
+        # Rebuild silently, then run the selection handler once for the reset state.
+        with QtCore.QSignalBlocker(self.staff_combo):
+            self.staff_combo.clear()
+            self.staff_combo.addItem("Select staff", None)
+            for staff in staff_list:
+                label = staff.get("name") or staff.get("username") or "Unknown"
+                role = staff.get("role") or ""
+                display = f"{label} ({role})" if role else label
+                self.staff_combo.addItem(display, staff)
+        self._on_staff_changed()
 
     def _on_staff_changed(self) -> None:
         """When staff selection changes, check for open attendance to set button label."""
@@ -517,6 +999,10 @@ class POSWindow(QtWidgets.QMainWindow):
         if not self.model:
             self._show_error("Database connection not ready.")
             return
+        if self._payment_in_flight():
+            # The cart is being charged or stored; it must not change underneath that.
+            self._show_info("Finish the current payment before scanning more items.")
+            return
         try:
             product = self.model.fetch_product_by_barcode(barcode)
         except DatabaseError as exc:
@@ -531,37 +1017,30 @@ class POSWindow(QtWidgets.QMainWindow):
         if not self.model:
             self._show_error("Database connection not ready.")
             return
-        dialog = SearchDialog(self.model, self)
+        if self._search_dialog is None:
+            self._search_dialog = SearchDialog(self.model, self)
+        else:
+            self._search_dialog.reset()
+        dialog = self._search_dialog
         if dialog.exec_() == QtWidgets.QDialog.Accepted and dialog.selected_product:
             self._add_product_to_table(dialog.selected_product)
 
     def _add_product_to_table(self, product: dict[str, Any]) -> None:
-        table: QtWidgets.QTableWidget = self.table
-        qty = 1
-        price = float(product.get("sell_price") or 0)
-        if not self._can_use_qty(product, qty):
-            return
-        amount = price * qty
-
-        row = self._find_empty_row(table)
-        if row is None:
-            row = table.rowCount()
-            table.insertRow(row)
-
-        table.setItem(row, 0, QtWidgets.QTableWidgetItem(str(product.get("name", ""))))
-        table.setItem(row, 1, QtWidgets.QTableWidgetItem(str(qty)))
-        table.setItem(row, 2, QtWidgets.QTableWidgetItem(f"{price:.2f}"))
-        table.setItem(row, 3, QtWidgets.QTableWidgetItem(f"{amount:.2f}"))
-        table.selectRow(row)
-        self.row_products[row] = product
-        self._recalculate_totals()
-
-    def _find_empty_row(self, table: QtWidgets.QTableWidget) -> int | None:
-        for row in range(table.rowCount()):
-            item = table.item(row, 0)
-            if item is None or not item.text().strip():
-                return row
-        return None
+        """Add one unit; a product already in the cart gets its qty bumped instead of a new line."""
+        row = self.cart.row_for_barcode(product.get("barcode"))
+        if row is not None:
+            qty = self.cart.lines()[row]["qty"] + 1
+            if not self._can_use_qty(product, qty):
+                return
+            self.cart.set_qty(row, qty)
+        else:
+            qty = 1.0
+            price = float(product.get("sell_price") or 0)
+            if not self._can_use_qty(product, qty):
+                return
+            row = self.cart.add_line(product, qty, price)
+        self.table.selectRow(row)
+        self._update_totals_labels()
 
     def _show_error(self, message: str) -> None:
         QtWidgets.QMessageBox.critical(self, "Error", message)
@@ -570,41 +1049,23 @@ class POSWindow(QtWidgets.QMainWindow):
         QtWidgets.QMessageBox.information(self, "Info", message)
 
     def void_selected_item(self) -> None:
-        """Clear the currently selected row."""
-        row = self.table.currentRow()
+        """Remove the currently selected row."""
+        row = self.table.currentIndex().row()
         if row < 0:
             self._show_info("Select a row to void.")
             return
-        self._clear_row(row)
-        self._recalculate_totals()
+        self.cart.remove_line(row)
+        self._update_totals_labels()
 
     def void_all_items(self) -> None:
-        """Clear all rows."""
-        for row in range(self.table.rowCount()):
-            self._clear_row(row)
-        self._recalculate_totals()
-
-    def _clear_row(self, row: int) -> None:
-        for col in range(self.table.columnCount()):
-            self.table.setItem(row, col, QtWidgets.QTableWidgetItem(""))
-        self.row_products.pop(row, None)
-
-    def _recalculate_totals(self) -> None:
-        total = 0.0
-        item_count = 0
-        for row in range(self.table.rowCount()):
-            desc_item = self.table.item(row, 0)
-            if not desc_item or not desc_item.text().strip():
-                continue
-            qty_item = self.table.item(row, 1)
-            price_item = self.table.item(row, 2)
-            qty = self._safe_float(qty_item.text()) if qty_item else 0.0
-            price = self._safe_float(price_item.text()) if price_item else 0.0
-            line_total = qty * price
-            total += line_total
-            item_count += 1
-            # keep amount column synced
-            self.table.setItem(row, 3, QtWidgets.QTableWidgetItem(f"{line_total:.2f}"))
+        """Remove all rows."""
+        self.cart.clear()
+        self._update_totals_labels()
+
+    def _update_totals_labels(self) -> None:
+        total = self.cart.total
+        item_count = self.cart.rowCount()
+        self._totals["amount"] = self._totals["total"] = self._totals["gst"] = total
 
         self.amount_label.setText(f"${total:.2f}")
         self.total_label.setText(f"${total:.2f}")
@@ -623,6 +1084,12 @@ class POSWindow(QtWidgets.QMainWindow):
         self.pad_buffer = ""
         self._update_pad_display()
 
+    def _on_pad_digit(self) -> None:
+        self._pad_append(self.sender().text())
+
+    def _on_pad_mode(self) -> None:
+        self._pad_set_mode(self.sender().property("padMode"))
+
     def _pad_append(self, char: str) -> None:
         self.pad_buffer += char
         self._update_pad_display()
@@ -646,21 +1113,21 @@ class POSWindow(QtWidgets.QMainWindow):
         if not self.pad_buffer:
             self._show_info("Enter a value first.")
             return
-        row = self.table.currentRow()
+        row = self.table.currentIndex().row()
         if row < 0:
             self._show_info("Select a row to update.")
             return
         value = self._safe_float(self.pad_buffer)
         if self.pad_mode == "qty":
-            product = self.row_products.get(row, {})
+            product = self.cart.lines()[row]["product"]
             if not self._can_use_qty(product, value):
                 self.pad_buffer = ""
                 self._update_pad_display()
                 return
-            self.table.setItem(row, 1, QtWidgets.QTableWidgetItem(f"{value:g}"))
+            self.cart.set_qty(row, value)
         elif self.pad_mode == "price":
-            self.table.setItem(row, 2, QtWidgets.QTableWidgetItem(f"{value:.2f}"))
-        self._recalculate_totals()
+            self.cart.set_price(row, value)
+        self._update_totals_labels()
         self.pad_buffer = ""
         self._update_pad_display()
 
@@ -670,11 +1137,17 @@ class POSWindow(QtWidgets.QMainWindow):
 
     # --- Payment flow -------------------------------------------------------
     def handle_payment(self) -> None:
+        if self._payment_in_flight():
+            return
         if self._cart_is_empty():
             self._show_info("Add items before payment.")
             return
         total = self._current_total()
-        dialog = PaymentDialog(total, self)
+        if self._payment_dialog is None:
+            self._payment_dialog = PaymentDialog(total, self)
+        else:
+            self._payment_dialog.reset(total)
+        dialog = self._payment_dialog
         if dialog.exec_() != QtWidgets.QDialog.Accepted:
             return
         method = dialog.selected_method
@@ -684,55 +1157,61 @@ class POSWindow(QtWidgets.QMainWindow):
             if tendered is None or tendered < total:
                 self._show_error("Cash received is insufficient.")
                 return
-            change = tendered - total
             self._open_cash_drawer()
-            success = True
-            error_message = None
-        else:  # card
-            success, error_message = self._process_card_payment(total)
-            change = 0.0
-
-        if not success:
-            self._show_error(error_message or "Payment failed.")
-            return
-
-        items = self._collect_cart_items()
-        saved = False
-        with self._loading_overlay("Saving sale..."):
-            try:
-                saved = self.model.record_sale(items, method) if self.model else False
-            except DatabaseError as exc:
-                self._show_error(f"Could not store sale: {exc}")
-                return
+            self._complete_sale(method, tendered - total)
+        else:  # card; the sale completes in _on_linkly_response
+            self._start_card_payment(total)
 
+    def _complete_sale(
+        self,
+        method: str,
+        change: float,
+        items: list[dict[str, Any]] | None = None,
+    ) -> None:
+        if items is None:
+            items = self._collect_cart_items()
+        if not self.model:
+            self._show_error("Could not store sale.")
+            return
+        task = RecordSaleTask(self.model, items, method)
+        task.signals.finished.connect(functools.partial(self._on_sale_recorded, change))
+        task.signals.failed.connect(self._on_sale_failed)
+        self._sale_task = task
+        self._show_loading_overlay("Saving sale...")
+        QtCore.QThreadPool.globalInstance().start(task)
+
+    def _on_sale_recorded(self, change: float, saved: bool) -> None:
+        self._sale_task = None
+        self._hide_loading_overlay()
         if saved:
+            self._cache_dirty = True
+            self._invalidate_search_results()
             self._show_info(f"Payment successful. Change: ${change:.2f}")
             self.void_all_items()
         else:
             self._show_error("Could not store sale.")
 
+    def _on_sale_failed(self, message: str) -> None:
+        self._sale_task = None
+        self._hide_loading_overlay()
+        self._show_error(f"Could not store sale: {message}")
+
+    def _payment_in_flight(self) -> bool:
+        return self._linkly_task is not None or self._sale_task is not None
+
     def _cart_is_empty(self) -> bool:
-        for row in range(self.table.rowCount()):
-            item = self.table.item(row, 0)
-            if item and item.text().strip():
-                return False
-        return True
+        return self.cart.rowCount() == 0
 
     def _current_total(self) -> float:
-        return self._safe_float(self.total_label.text().replace("$", ""))
+        return self._totals["total"]
 
     def _collect_cart_items(self) -> list[dict[str, Any]]:
         items: list[dict[str, Any]] = []
-        for row in range(self.table.rowCount()):
-            desc_item = self.table.item(row, 0)
-            if not desc_item or not desc_item.text().strip():
-                continue
-            qty_item = self.table.item(row, 1)
-            price_item = self.table.item(row, 2)
-            qty = self._safe_float(qty_item.text()) if qty_item else 0.0
-            price = self._safe_float(price_item.text()) if price_item else 0.0
+        for line in self.cart.lines():
+            qty = line["qty"]
+            price = line["price"]
             amount = qty * price
-            product = self.row_products.get(row, {})
+            product = line["product"]
             items.append(
                 {
                     "id": product.get("id"),
@@ -750,18 +1229,33 @@ class POSWindow(QtWidgets.QMainWindow):
         # Placeholder: integrate with actual drawer trigger.
         self._show_info("Cash drawer opened.")
 
-    def _process_card_payment(self, total: float) -> tuple[bool, str | None]:
+    def _start_card_payment(self, total: float) -> None:
+        """Hand the sale to the terminal on the thread pool; the clock keeps ticking meanwhile."""
         items = self._collect_cart_items()
         payload = self._build_linkly_sale_payload(total, items)
-        with self._loading_overlay("Sending to EFTPOS..."):
-            try:
-                response = self._send_linkly_payload(payload)
-            except LinklyError as exc:
-                return False, str(exc)
+        task = LinklyTask(self._linkly, self._encode_linkly_payload(payload))
+        # The sale is recorded from the items that were charged, not from the cart as it is later.
+        task.signals.finished.connect(functools.partial(self._on_linkly_response, items))
+        task.signals.failed.connect(self._on_linkly_failed)
+        self._linkly_task = task
+        self._show_loading_overlay("Sending to EFTPOS...")
+        QtCore.QThreadPool.globalInstance().start(task)
+
+    def _on_linkly_response(self, items: list[dict[str, Any]], response: bytes) -> None:
+        self._finish_card_payment()
         approved, message = self._interpret_linkly_response(response)
         if not approved:
-            return False, message or "Card payment declined."
-        return True, None
+            self._show_error(message or "Card payment declined.")
+            return
+        self._complete_sale("card", 0.0, items)
+
+    def _on_linkly_failed(self, message: str) -> None:
+        self._finish_card_payment()
+        self._show_error(message)
+
+    def _finish_card_payment(self) -> None:
+        self._linkly_task = None
+        self._hide_loading_overlay()
 
     def _build_linkly_sale_payload(
         self,
@@ -770,72 +1264,43 @@ class POSWindow(QtWidgets.QMainWindow):
     ) -> dict[str, Any]:
         reference = QtCore.QDateTime.currentDateTime().toString("yyyyMMddHHmmss")
         staff_name = (self.current_staff or {}).get("username") or (self.current_staff or {}).get("name")
-        payload_items = [
-            {
-                "name": item.get("name"),
-                "barcode": item.get("barcode"),
-                "qty": item.get("qty"),
-                "price": item.get("price"),
-                "amount": item.get("amount"),
-            }
-            for item in items
-        ]
-        return {
-            "type": "SALE",
-            "reference": reference,
-            "amount_cents": int(round(total * 100)),
-            "amount": round(total, 2),
-            "currency": "MYR",
-            "sub_total": self._money_label_value(self.amount_label),
-            "discount_total": self._money_label_value(self.discount_label),
-            "gst_total": self._money_label_value(self.gst_label),
-            "items": payload_items,
-            "operator": staff_name,
-            "terminal": self.windowTitle(),
-        }
-
-    def _money_label_value(self, label: QtWidgets.QLabel) -> float:
-        return self._safe_float(label.text().replace("$", "").strip())
-
-    def _send_linkly_payload(self, payload: dict[str, Any]) -> bytes:
-        message = self._encode_linkly_payload(payload)
-        try:
-            with socket.create_connection((LINKLY_HOST, LINKLY_PORT), timeout=LINKLY_TIMEOUT_SECS) as sock:
-                sock.settimeout(LINKLY_TIMEOUT_SECS)
-                sock.sendall(message)
-                return self._read_linkly_response(sock)
-        except (OSError, socket.timeout) as exc:
-            raise LinklyError(f"Linkly connection failed: {exc}") from exc
+        payload = LINKLY_SALE_TEMPLATE.copy()
+        payload["reference"] = reference
+        payload["amount_cents"] = int(round(total * 100))
+        payload["amount"] = round(total, 2)
+        payload["sub_total"] = round(self._totals["amount"], 2)
+        payload["discount_total"] = round(self._totals["discount"], 2)
+        payload["gst_total"] = round(self._totals["gst"], 2)
+        payload["items"] = [{key: item.get(key) for key in LINKLY_ITEM_KEYS} for item in items]
+        payload["operator"] = staff_name
+        payload["terminal"] = self.windowTitle()
+        return payload
 
     def _encode_linkly_payload(self, payload: dict[str, Any]) -> bytes:
+        if orjson is not None:
+            body = orjson.dumps(payload)
+            # orjson emits raw UTF-8; the terminal has always been sent ASCII-escaped JSON.
+            if body.isascii():
+                return body + b"\n"
         body = json.dumps(payload, ensure_ascii=True, separators=(",", ":"))
         return body.encode("utf-8") + b"\n"
 
-    def _read_linkly_response(self, sock: socket.socket) -> bytes:
-        chunks: list[bytes] = []
-        while True:
-            try:
-                data = sock.recv(4096)
-            except socket.timeout:
-                break
-            if not data:
-                break
-            chunks.append(data)
-            if b"\n" in data:
-                break
-        return b"".join(chunks).strip()
-
     def _interpret_linkly_response(self, response: bytes) -> tuple[bool, str | None]:
         if not response:
             return False, "No response from Linkly."
-        text = response.decode("utf-8", errors="replace").strip()
+        # Both parsers take bytes; decode errors are ValueErrors like JSONDecodeError.
         try:
-            parsed = json.loads(text)
-        except json.JSONDecodeError:
-            upper = text.upper()
-            if "APPROVED" in upper or "SUCCESS" in upper:
+            parsed = orjson.loads(response) if orjson is not None else json.loads(response)
+        except ValueError:
+            parsed = None
+        # Only a JSON object has the approved/message fields; anything else is read as plain text.
+        if not isinstance(parsed, dict):
+            # One scan for every keyword; an approval word anywhere still wins over a failure word.
+            keywords = {word.upper() for word in LINKLY_RESPONSE_KEYWORDS_RE.findall(response)}
+            if keywords & LINKLY_APPROVED_KEYWORDS:
                 return True, None
-            if "DECLINED" in upper or "FAILED" in upper or "ERROR" in upper:
+            text = response.decode("utf-8", errors="replace")
+            if keywords:
                 return False, text
             return False, f"Unrecognized Linkly response: {text}"
         approved = bool(parsed.get("approved") or parsed.get("success"))
@@ -844,35 +1309,33 @@ class POSWindow(QtWidgets.QMainWindow):
         reason = parsed.get("message") or parsed.get("responseText") or "Card payment declined."
         return False, str(reason)
 
-    @contextlib.contextmanager
-    def _loading_overlay(self, text: str):
-        dialog = QtWidgets.QProgressDialog(text, None, 0, 0, self)
-        dialog.setWindowTitle("Please wait")
-        dialog.setWindowModality(QtCore.Qt.ApplicationModal)
-        dialog.setCancelButton(None)
-        dialog.setMinimumDuration(0)
-        dialog.setAutoClose(True)
-        dialog.show()
-        QtWidgets.QApplication.processEvents()
-        try:
-            yield
-        finally:
-            dialog.close()
+    def _show_loading_overlay(self, text: str) -> None:
+        """Show the one busy overlay this window keeps, building it on first use."""
+        if self._busy is None:
+            self._busy = BusyOverlay(self)
+        if not self._busy.isVisible():
+            # The overlay takes focus while shown; hand it back to this widget afterwards.
+            self._focus_before_busy = QtWidgets.QApplication.focusWidget()
+        self._busy.set_text(text)
+        self._busy.show()
+
+    def _hide_loading_overlay(self) -> None:
+        if self._busy is None or not self._busy.isVisible():
+            return
+        self._busy.hide()
+        widget, self._focus_before_busy = self._focus_before_busy, None
+        if widget is not None:
+            # The widget may have been deleted while the overlay was up.
+            with contextlib.suppress(RuntimeError):
+                widget.setFocus()
 
     # --- Stock helpers ------------------------------------------------------
     def _can_use_qty(self, product: dict[str, Any], qty: float) -> bool:
         """Check stock before applying qty; allow override prompt."""
-        if self._has_sufficient_stock(product, qty):
+        available_units = self._available_units(product)
+        if self._has_sufficient_stock(available_units, qty):
             return True
         name = product.get("name", "Item")
-        stock = product.get("stock", 0)
-        try:
-            stock_val = float(stock)
-            deduct_val = float(product.get("deduct_unit") or 1.0)
-            deduct_val = deduct_val if deduct_val != 0 else 1.0
-            available_units = stock_val / deduct_val
-        except Exception:
-            available_units = 0
         msg = (
             f"Not enough stock for {name}.\n"
             f"Requested qty: {qty}\n"
@@ -886,20 +1349,29 @@ class POSWindow(QtWidgets.QMainWindow):
         )
         return override == QtWidgets.QMessageBox.Yes
 
-    def _has_sufficient_stock(self, product: dict[str, Any], qty: float) -> bool:
+    def _has_sufficient_stock(self, available_units: float | None, qty: float) -> bool:
+        return available_units is None or qty <= available_units + 1e-6
+
+    def _available_units(self, product: dict[str, Any]) -> float | None:
+        """Sellable units left (stock / deduct_unit), or None when stock is unknown."""
         if not product:
-            return True
+            return None
         stock = product.get("stock")
-        deduct_unit = product.get("deduct_unit") or 1.0
         if stock is None:
-            return True
-        try:
-            stock_val = float(stock)
-            deduct_val = float(deduct_unit) if float(deduct_unit) != 0 else 1.0
-            available_units = stock_val / deduct_val
-        except Exception:
-            return True
-        return qty <= available_units + 1e-6
+            return None
+        deduct = product.get("deduct_unit") or 1.0
+        # Rows from the model are already numeric; only odd values pay for a conversion.
+        if not isinstance(stock, (int, float)):
+            try:
+                stock = float(stock)
+            except (TypeError, ValueError):
+                return None
+        if not isinstance(deduct, (int, float)):
+            try:
+                deduct = float(deduct)
+            except (TypeError, ValueError):
+                return None
+        return stock / (deduct or 1.0)
 
     # --- Attendance / staff -------------------------------------------------
     def handle_clock_action(self) -> None:
@@ -911,7 +1383,11 @@ class POSWindow(QtWidgets.QMainWindow):
             self._show_info("Select staff.")
             return
         username = staff_data.get("username", "")
-        pwd_dialog = PasswordDialog(username, self)
+        if self._password_dialog is None:
+            self._password_dialog = PasswordDialog(username, self)
+        else:
+            self._password_dialog.reset(username)
+        pwd_dialog = self._password_dialog
         if pwd_dialog.exec_() != QtWidgets.QDialog.Accepted:
             return
         username = pwd_dialog.get_username()
@@ -919,79 +1395,130 @@ class POSWindow(QtWidgets.QMainWindow):
         if not password:
             self._show_info("Password required.")
             return
-
+        role = self.role_field.currentText()
+        # Verification, the attendance lookup and the clock in/out run as one transaction.
         try:
-            staff = self.model.verify_staff_credentials(username, password)
+            result = self.model.authenticate_and_toggle_clock(username, password, role)
         except DatabaseError as exc:
-            self._show_error(f"Auth failed: {exc}")
+            self._show_error(f"Clock action failed: {exc}")
             return
-        if not staff:
+        if result is None:
             self._show_error("Invalid credentials or inactive staff.")
             return
+        staff = result["staff"]
         self.current_staff = staff
-
-        try:
-            today_att = self.model.get_today_attendance(staff["id"])
-        except DatabaseError as exc:
-            self._show_error(f"Attendance lookup failed: {exc}")
-            return
-
-        if today_att and not today_att.get("time_out"):
-            # Clock out
-            att_id = today_att["id"]
-            try:
-                success = self.model.clock_out(att_id)
-            except DatabaseError as exc:
-                self._show_error(f"Clock-out failed: {exc}")
-                return
-            if success:
-                self._show_info(f"{staff.get('name') or staff.get('username')} clocked out.")
-                self.current_attendance_id = None
-                self._update_clock_button_label(clockedin=False)
-            else:
+        display_name = staff.get("name") or staff.get("username")
+        if result["action"] == "out":
+            if not result["updated"]:
                 self._show_error("Clock-out did not update.")
-        else:
-            # Clock in
-            role = self.role_field.currentText()
-            salary = float(staff.get("salary") or 0.0)
-            try:
-                att_id = self.model.clock_in(staff["id"], role, salary=salary)
-            except DatabaseError as exc:
-                self._show_error(f"Clock-in failed: {exc}")
                 return
-            self.current_attendance_id = att_id
-            self._show_info(f"{staff.get('name') or staff.get('username')} clocked in as {role}.")
+            self._show_info(f"{display_name} clocked out.")
+            self.current_attendance_id = None
+            self._update_clock_button_label(clockedin=False)
+        else:
+            self.current_attendance_id = result["attendance_id"]
+            self._show_info(f"{display_name} clocked in as {role}.")
             self._update_clock_button_label(clockedin=True)
 
     def _update_clock_button_label(self, clockedin: bool) -> None:
         self.clock_button.setText("Clock Out" if clockedin else "Clock In")
 
 
+class ProductListModel(QtCore.QAbstractListModel):
+    """Search results for a QListView; rows are only formatted when the view asks for them."""
+
+    def __init__(self, parent: QtCore.QObject | None = None) -> None:
+        super().__init__(parent)
+        self.rows: list[dict[str, Any]] = []
+        self._texts: list[str | None] = []
+        self._placeholder: str | None = None
+
+    def rowCount(self, parent: QtCore.QModelIndex = QtCore.QModelIndex()) -> int:
+        if parent.isValid():
+            return 0
+        return len(self.rows) or (1 if self._placeholder else 0)
+
+    def data(self, index: QtCore.QModelIndex, role: int = QtCore.Qt.DisplayRole) -> Any:
+        if not index.isValid() or role != QtCore.Qt.DisplayRole:
+            return None
+        if not self.rows:
+            return self._placeholder
+        row = index.row()
+        text = self._texts[row]
+        if text is None:
+            # Formatted on first paint, then reused for hover and scroll repaints.
+            product = self.rows[row]
+            text = self._texts[row] = SEARCH_ROW_FORMAT(
+                name=product.get("name", "Unknown"),
+                barcode=product.get("barcode", ""),
+                price=float(product.get("sell_price") or 0),
+            )
+        return text
+
+    def set_rows(self, rows: list[dict[str, Any]], placeholder: str | None = None) -> None:
+        """Replace all rows; `placeholder` is shown as the only line when `rows` is empty."""
+        self.beginResetModel()
+        self.rows = rows
+        self._texts = [None] * len(rows)
+        self._placeholder = placeholder
+        self.endResetModel()
+
+
 class SearchDialog(QtWidgets.QDialog):
     """Simple dialog to search products by name/barcode and pick one."""
 
+    RESULT_LIMIT = 12
+    DEBOUNCE_MS = 150
+
     def __init__(self, model: ProductModel, parent: QtWidgets.QWidget | None = None) -> None:
         super().__init__(parent)
         self.model = model
         self.selected_product: dict[str, Any] | None = None
+        # Repeat queries are answered from memory until the owner calls clear_cache().
+        self._cached_search = functools.lru_cache(maxsize=128)(self._search)
+        # Enter and the Search button only arm this timer, so a burst of presses runs one query.
+        self._debounce = QtCore.QTimer(self)
+        self._debounce.setSingleShot(True)
+        self._debounce.setInterval(self.DEBOUNCE_MS)
+        self._debounce.timeout.connect(self.perform_search)
         self.setWindowTitle("Search Stock")
         self.resize(420, 420)
         self._build_ui()
 
+    def reset(self) -> None:
+        """Clear the previous query and results so the dialog can be reopened."""
+        self._debounce.stop()
+        self.selected_product = None
+        self.input.clear()
+        self.result_model.set_rows([])
+        self.results.setEnabled(True)
+
+    def clear_cache(self) -> None:
+        self._cached_search.cache_clear()
+
+    def _search(self, query: str) -> tuple[dict[str, Any], ...]:
+        return tuple(self.model.search_products(query, limit=self.RESULT_LIMIT))
+
+    def _schedule_search(self) -> None:
+        self._debounce.start()
+
     def _build_ui(self) -> None:
         layout = QtWidgets.QVBoxLayout(self)
         self.input = QtWidgets.QLineEdit()
         self.input.setPlaceholderText("Enter name or barcode...")
-        self.input.returnPressed.connect(self.perform_search)
+        self.input.returnPressed.connect(self._schedule_search)
         layout.addWidget(self.input)
 
-        self.results = QtWidgets.QListWidget()
-        self.results.itemDoubleClicked.connect(self._accept_current)
+        self.result_model = ProductListModel(self)
+        self.results = QtWidgets.QListView()
+        self.results.setModel(self.result_model)
+        self.results.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
+        self.results.doubleClicked.connect(self._accept_current)
         layout.addWidget(self.results, 1)
 
         btn_row = QtWidgets.QHBoxLayout()
         search_btn = QtWidgets.QPushButton("Search")
-        search_btn.clicked.connect(self.perform_search)
+        search_btn.clicked.connect(self._schedule_search)
         ok_btn = QtWidgets.QPushButton("Add")
         ok_btn.clicked.connect(self._accept_current)
         cancel_btn = QtWidgets.QPushButton("Cancel")
@@ -1007,35 +1534,25 @@ class SearchDialog(QtWidgets.QDialog):
         if not query:
             return
         try:
-            results = self.model.search_products(query, limit=12)
+            results = self._cached_search(query)
         except DatabaseError as exc:
             QtWidgets.QMessageBox.critical(self, "Error", f"Search failed: {exc}")
             return
 
-        self.results.clear()
         if not results:
-            self.results.addItem("(No results)")
+            self.result_model.set_rows([], placeholder="(No results)")
             self.results.setEnabled(False)
             return
 
         self.results.setEnabled(True)
-        for product in results:
-            name = product.get("name", "Unknown")
-            barcode = product.get("barcode", "")
-            price = product.get("sell_price") or 0
-            item = QtWidgets.QListWidgetItem(f"{name}  [{barcode}]  RM {price:.2f}")
-            item.setData(QtCore.Qt.UserRole, product)
-            self.results.addItem(item)
-        self.results.setCurrentRow(0)
+        self.result_model.set_rows(list(results))
+        self.results.setCurrentIndex(self.result_model.index(0))
 
     def _accept_current(self) -> None:
-        item = self.results.currentItem()
-        if not item:
-            return
-        product = item.data(QtCore.Qt.UserRole)
-        if not product or not isinstance(product, dict):
+        row = self.results.currentIndex().row()
+        if not 0 <= row < len(self.result_model.rows):
             return
-        self.selected_product = product
+        self.selected_product = self.result_model.rows[row]
         self.accept()
 
 